@@ -1,14 +1,16 @@
 # Written by: Turner Miles Peeples
 
+import base64
 import tkinter as tk
 from tkinter import ttk, messagebox
 import logging
 from datetime import datetime
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
 from log import TransactionManager
-from stats import StatsManager
+from transaction import parse_timestamp
+from journal import TransactionJournal
+from stats import CHART_CACHE_SIZE, StatsManager
+from render_worker import RenderWorker
 from account import AccountManager
 from cal_manager import CalendarManager
 from wallet import WalletManager
@@ -24,7 +26,9 @@ class TransactionGUI:
         self.root.geometry("800x600")
 
         logger.debug("Initializing TransactionManager")
-        self.transaction_manager = TransactionManager()
+        self.transaction_manager = TransactionManager(store=TransactionJournal(), lazy=True)
+        # Only the first page is read up front; the rest streams in once the window is up
+        self.transaction_manager.load_next_page()
         logger.debug("Initializing AccountManager")
         self.account_manager = AccountManager()
         logger.debug("Initializing StatsManager")
@@ -39,13 +43,54 @@ class TransactionGUI:
             "Dark": {"bg": "#333333", "fg": "#ffffff", "content_bg": "#444444", "button_bg": "#2196F3", "button_fg": "#ffffff"}
         }
         self.current_theme = "Light"
+        self.sort_column = None
+        self.sort_reverse = False
+        self.chart_images = {}
+        self.render_worker = RenderWorker()
+        self.render_polling = False
 
         self.tab_frames = {}
         self.sidebar_buttons = {}
         logger.debug("Calling setup_gui")
         self.setup_gui()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(1, self.load_remaining_transactions)
         logger.debug("Completed TransactionGUI initialization")
 
+    def load_remaining_transactions(self):
+        try:
+            page = self.transaction_manager.load_next_page()
+        except Exception as e:
+            logger.error(f"Error loading transactions: {e}")
+            page = None
+
+        if page is None:
+            logger.debug("Finished loading transactions")
+            if self.current_tab == "Dashboard":
+                self.update_dashboard()
+            elif self.current_tab == "Transactions":
+                self.update_transaction_list()
+                self.payment_dropdown.configure(values=self.transaction_manager.get_payment_methods())
+            elif self.current_tab == "Calendar":
+                self.update_calendar()
+            elif self.current_tab in ("Statistics", "Payment"):
+                self.switch_tab(self.current_tab)
+            return
+
+        # A sorted list is redrawn once loading finishes, since new rows can land anywhere in it
+        if self.current_tab == "Transactions" and self.sort_column is None:
+            for t in page:
+                self.transaction_list.insert("", "end", iid=str(t.id), values=(f"${t['Amount']:.2f}", t["Category"], t["Recipient"], t["Date"]))
+        self.root.after(1, self.load_remaining_transactions)
+
+    def on_close(self):
+        self.render_worker.shutdown()
+        try:
+            self.transaction_manager.close()
+        except Exception as e:
+            logger.error(f"Error closing transaction manager: {e}")
+        self.root.destroy()
+
     def setup_gui(self):
         self.root.configure(bg=self.themes[self.current_theme]["bg"])
 
@@ -170,17 +215,17 @@ class TransactionGUI:
     def update_dashboard(self):
         logger.debug("Starting update_dashboard")
         try:
-            transactions = self.transaction_manager.get_transactions()
-            income = sum(t["Amount"] for t in transactions if t["Category"] == "Deposit")
-            expenses = sum(t["Amount"] for t in transactions if t["Category"] in ["Expense", "Invoice"])
-            net = income - expenses
+            totals = self.transaction_manager.totals()
+            income = totals["income"]
+            expenses = totals["expenses"]
+            net = totals["net"]
 
             self.balance_value.config(text=f"${net:.2f}")
             self.summary_label.config(text=f"Income: ${income:.2f} | Expenses: ${expenses:.2f} | Net: ${net:.2f}")
 
             for row in self.recent_payments.get_children():
                 self.recent_payments.delete(row)
-            for t in transactions[-3:]:
+            for t in self.transaction_manager.recent(3):
                 self.recent_payments.insert("", "end", values=(f"${t['Amount']:.2f}", t["Recipient"], t["Date"]))
 
             for widget in self.wallet_preview.winfo_children():
@@ -254,17 +299,12 @@ class TransactionGUI:
         self.update_transaction_list()
 
     def sort_transactions(self, column):
-        transactions = self.transaction_manager.get_transactions()
-        reverse = getattr(self, f"sort_reverse_{column}", False)
-        if column == "Amount":
-            transactions.sort(key=lambda t: t[column], reverse=reverse)
-        elif column == "Date":
-            transactions.sort(key=lambda t: datetime.strptime(t[column], "%Y-%m-%d %H:%M:%S"), reverse=reverse)
+        # Clicking the same header again flips the direction; the manager keeps each column's order cached
+        if self.sort_column == column:
+            self.sort_reverse = not self.sort_reverse
         else:
-            transactions.sort(key=lambda t: t[column], reverse=reverse)
-
-        setattr(self, f"sort_reverse_{column}", not reverse)
-        self.transaction_manager.transactions = transactions
+            self.sort_column = column
+            self.sort_reverse = False
         self.update_transaction_list()
 
     def add_transaction(self):
@@ -303,17 +343,9 @@ class TransactionGUI:
             messagebox.showwarning("Warning", "Please select a transaction to edit")
             return
 
-        item = self.transaction_list.item(selected[0])
-        values = item['values']
-        amount, category, recipient, date = values
-
-        transactions = self.transaction_manager.get_transactions()
-        transaction = None
-        for t in transactions:
-            if (f"${t['Amount']:.2f}" == amount and t['Category'] == category and
-                t['Recipient'] == recipient and t['Date'] == date):
-                transaction = t
-                break
+        # Rows are inserted with the transaction id as their iid
+        transaction_id = int(selected[0])
+        transaction = self.transaction_manager.get_by_id(transaction_id)
 
         if not transaction:
             messagebox.showerror("Error", "Transaction not found")
@@ -350,13 +382,14 @@ class TransactionGUI:
                 new_recipient = entry_recipient.get()
                 new_payment_method = payment_var.get()
 
-                transaction["Amount"] = new_amount
-                transaction["Category"] = new_category
-                transaction["Recipient"] = new_recipient
-                transaction["PaymentMethod"] = new_payment_method
-                transaction["Description"] = f"{new_category} to {new_recipient}"
-
-                self.transaction_manager.save_data()
+                self.transaction_manager.update_by_id(
+                    transaction_id,
+                    Amount=new_amount,
+                    Category=new_category,
+                    Recipient=new_recipient,
+                    PaymentMethod=new_payment_method,
+                    Description=f"{new_category} to {new_recipient}"
+                )
                 self.update_transaction_list()
                 self.update_dashboard()
                 edit_window.destroy()
@@ -375,26 +408,14 @@ class TransactionGUI:
             messagebox.showwarning("Warning", "Please select a transaction to delete")
             return
 
-        item = self.transaction_list.item(selected[0])
-        values = item['values']
-        amount, category, recipient, date = values
-
-        transactions = self.transaction_manager.get_transactions()
-        transaction_index = None
-        for i, t in enumerate(transactions):
-            if (f"${t['Amount']:.2f}" == amount and t['Category'] == category and
-                t['Recipient'] == recipient and t['Date'] == date):
-                transaction_index = i
-                break
-
-        if transaction_index is None:
+        transaction_id = int(selected[0])
+        if self.transaction_manager.get_by_id(transaction_id) is None:
             messagebox.showerror("Error", "Transaction not found")
             return
 
         try:
             # Remove the transaction
-            self.transaction_manager.transactions.pop(transaction_index)
-            self.transaction_manager.save_data()
+            self.transaction_manager.delete_by_id(transaction_id)
             self.update_transaction_list()
             self.update_dashboard()
             self.update_calendar()
@@ -407,9 +428,12 @@ class TransactionGUI:
         try:
             for row in self.transaction_list.get_children():
                 self.transaction_list.delete(row)
-            transactions = self.transaction_manager.get_transactions()
+            if self.sort_column is None:
+                transactions = self.transaction_manager.get_transactions()
+            else:
+                transactions = self.transaction_manager.sorted_transactions(self.sort_column, self.sort_reverse)
             for t in transactions:
-                self.transaction_list.insert("", "end", values=(f"${t['Amount']:.2f}", t["Category"], t["Recipient"], t["Date"]))
+                self.transaction_list.insert("", "end", iid=str(t.id), values=(f"${t['Amount']:.2f}", t["Category"], t["Recipient"], t["Date"]))
             logger.debug("Updated transaction list")
         except Exception as e:
             logger.error(f"Error updating transaction list: {e}")
@@ -485,6 +509,7 @@ class TransactionGUI:
 
     def setup_statistics(self):
         logger.debug("Starting setup_statistics")
+        self.render_worker.cancel()
         frame = self.tab_frames["Statistics"]
         for widget in frame.winfo_children():
             widget.destroy()
@@ -496,74 +521,114 @@ class TransactionGUI:
         self.stats_notebook = ttk.Notebook(frame)
         self.stats_notebook.pack(expand=True, fill="both", padx=20, pady=5)
 
-        pie_frame = ttk.Frame(self.stats_notebook)
-        self.stats_notebook.add(pie_frame, text="Pie Chart")
-        pie_label = tk.Label(pie_frame, text="", font=("Arial", 12))
-        pie_label.pack(expand=True, fill="both")
-        try:
-            pie_result = self.stats_manager.get_pie_chart(pie_frame)
-            if pie_result:
-                pie_canvas, pie_fig = pie_result
-                pie_canvas.get_tk_widget().pack(expand=True, fill="both")
-            else:
-                pie_label.configure(text="No transaction data available")
-        except Exception as e:
-            logger.error(f"Failed to generate pie chart: {e}")
-            pie_label.configure(text="Error generating pie chart")
+        charts = [
+            ("pie", "Pie Chart", "No transaction data available"),
+            ("bar", "Bar Chart", "No spending data available"),
+            ("scatter", "Scatter Plot", "No spending data available"),
+            ("line", "Line Graph", "No spending data available"),
+        ]
+        # Each chart is drawn the first time its page is shown; until then the page holds a placeholder
+        self.stats_pages = {}
+        for chart, title, empty_text in charts:
+            chart_frame = ttk.Frame(self.stats_notebook)
+            self.stats_notebook.add(chart_frame, text=title)
+            label = tk.Label(chart_frame, text="Loading chart...", font=("Arial", 12))
+            label.pack(expand=True, fill="both")
+            self.stats_pages[str(chart_frame)] = (chart, title, empty_text, label)
+        self.stats_notebook.bind("<<NotebookTabChanged>>", self.on_stats_tab_changed)
+        self.on_stats_tab_changed()
 
-        bar_frame = ttk.Frame(self.stats_notebook)
-        self.stats_notebook.add(bar_frame, text="Bar Chart")
-        bar_label = tk.Label(bar_frame, text="", font=("Arial", 12))
-        bar_label.pack(expand=True, fill="both")
-        try:
-            bar_result = self.stats_manager.get_bar_chart(bar_frame)
-            if bar_result:
-                bar_canvas, bar_fig = bar_result
-                bar_canvas.get_tk_widget().pack(expand=True, fill="both")
-            else:
-                bar_label.configure(text="No spending data available")
-        except Exception as e:
-            logger.error(f"Failed to generate bar chart: {e}")
-            bar_label.configure(text="Error generating bar chart")
+        self.update_stats()
+        logger.debug("Completed setup_statistics")
+
+    def on_stats_tab_changed(self, event=None):
+        tab = self.stats_notebook.select()
+        page = self.stats_pages.get(tab)
+        if page is None:
+            # Already drawn, or the notebook is being torn down
+            return
+        chart, title, empty_text, label = page
+        key = (chart, self.transaction_manager.version, self.current_theme, self._chart_size(),
+               self.stats_manager.downsample)
+        hit, data = self.stats_manager.cached_chart(chart, key[2], key[3])
+        if key in self.chart_images or hit:
+            self._show_chart(tab, key, data)
+            return
 
-        scatter_frame = ttk.Frame(self.stats_notebook)
-        self.stats_notebook.add(scatter_frame, text="Scatter Plot")
-        scatter_label = tk.Label(scatter_frame, text="", font=("Arial", 12))
-        scatter_label.pack(expand=True, fill="both")
+        # Only the page on screen is worth drawing; anything still queued for another page is dropped
+        # and that page is drawn again when it is next selected
+        self.render_worker.cancel()
+        label.configure(text="Rendering chart...")
+        self.render_worker.submit(self.stats_manager.render_job(chart, key[2], key[3]),
+                                  lambda result, tab=tab: self.on_chart_rendered(tab, result))
+        self._poll_renders()
+
+    def on_chart_rendered(self, tab, result):
+        page = self.stats_pages.get(tab)
+        if page is None or not page[3].winfo_exists():
+            return
+        chart, title, empty_text, label = page
+        if isinstance(result, Exception):
+            del self.stats_pages[tab]
+            label.configure(text=f"Error generating {title.lower()}")
+            return
+        fresh, data = self.stats_manager.accept_render(result)
+        if not fresh:
+            # The transactions changed while rendering; start over if the page is still showing
+            if self.stats_notebook.select() == tab:
+                self.on_stats_tab_changed()
+            return
+        self._show_chart(tab, result[0], data)
+
+    def _show_chart(self, tab, key, data):
+        chart, title, empty_text, label = self.stats_pages.pop(tab)
         try:
-            scatter_result = self.stats_manager.get_scatter_plot(scatter_frame)
-            if scatter_result:
-                scatter_canvas, scatter_fig = scatter_result
-                scatter_canvas.get_tk_widget().pack(expand=True, fill="both")
+            # PhotoImages are kept per (chart, data version, theme, size), so reopening the tab with
+            # unchanged data neither redraws nor re-decodes anything
+            if key not in self.chart_images:
+                for stale in [k for k in self.chart_images if k[1] != key[1]]:
+                    del self.chart_images[stale]
+                self.chart_images[key] = None if data is None else tk.PhotoImage(data=base64.b64encode(data))
+                while len(self.chart_images) > CHART_CACHE_SIZE:
+                    del self.chart_images[next(iter(self.chart_images))]
+            image = self.chart_images[key]
+            if image is not None:
+                label.configure(image=image, text="")
             else:
-                scatter_label.configure(text="No spending data available")
+                label.configure(text=empty_text)
         except Exception as e:
-            logger.error(f"Failed to generate scatter plot: {e}")
-            scatter_label.configure(text="Error generating scatter plot")
+            logger.error(f"Failed to generate {title.lower()}: {e}")
+            label.configure(text=f"Error generating {title.lower()}")
 
-        line_frame = ttk.Frame(self.stats_notebook)
-        self.stats_notebook.add(line_frame, text="Line Graph")
-        line_label = tk.Label(line_frame, text="", font=("Arial", 12))
-        line_label.pack(expand=True, fill="both")
-        try:
-            line_result = self.stats_manager.get_line_graph(line_frame)
-            if line_result:
-                line_canvas, line_fig = line_result
-                line_canvas.get_tk_widget().pack(expand=True, fill="both")
+    def _poll_renders(self):
+        # Finished renders are picked up here, on the Tk thread, for as long as any are outstanding
+        if self.render_polling:
+            return
+        self.render_polling = True
+
+        def poll():
+            self.render_worker.poll()
+            if self.render_worker.pending:
+                self.root.after(30, poll)
             else:
-                line_label.configure(text="No spending data available")
-        except Exception as e:
-            logger.error(f"Failed to generate line graph: {e}")
-            line_label.configure(text="Error generating line graph")
+                self.render_polling = False
 
-        self.update_stats()
-        logger.debug("Completed setup_statistics")
+        self.root.after(30, poll)
+
+    def _chart_size(self):
+        # Charts are rendered to fit the notebook; before the window is mapped there is no real size yet
+        self.root.update_idletasks()
+        width = self.stats_notebook.winfo_width()
+        height = self.stats_notebook.winfo_height() - 30
+        if width < 100 or height < 100:
+            return (640, 480)
+        return (width, height)
 
     def update_stats(self):
         try:
-            transactions = self.transaction_manager.get_transactions()
-            total_income = sum(t["Amount"] for t in transactions if t["Category"] == "Deposit")
-            total_expenses = sum(t["Amount"] for t in transactions if t["Category"] in ["Expense", "Invoice"])
+            totals = self.transaction_manager.totals()
+            total_income = totals["income"]
+            total_expenses = totals["expenses"]
             logger.debug("Updated stats")
         except Exception as e:
             logger.error(f"Error updating stats: {e}")
@@ -703,13 +768,16 @@ class TransactionGUI:
     def update_calendar(self):
         try:
             self.calendar.delete(1.0, tk.END)
-            transactions = self.transaction_manager.get_transactions()
             appointments = self.calendar_manager.get_appointments()
 
-            self.calendar.insert(tk.END, "Payments:\n")
-            for t in transactions:
-                if t["Status"] == "Planned":
-                    self.calendar.insert(tk.END, f"{t['Date']}: {t['Description']} - ${t['Amount']:.2f}\n")
+            today = parse_timestamp(datetime.now().strftime("%Y-%m-%d"))
+            self.calendar.insert(tk.END, "Upcoming Payments:\n")
+            for t in self.transaction_manager.query(status="Planned", start=today, sort="Date"):
+                self.calendar.insert(tk.END, f"{t['Date']}: {t['Description']} - ${t['Amount']:.2f}\n")
+
+            self.calendar.insert(tk.END, "\nOverdue Payments:\n")
+            for t in self.transaction_manager.query(status="Planned", end=today, sort="Date"):
+                self.calendar.insert(tk.END, f"{t['Date']}: {t['Description']} - ${t['Amount']:.2f}\n")
 
             self.calendar.insert(tk.END, "\nAppointments:\n")
             for a in appointments:
@@ -830,6 +898,18 @@ class TransactionGUI:
                   bg=self.themes[self.current_theme]["button_bg"],
                   fg=self.themes[self.current_theme]["button_fg"]).pack(anchor="w", padx=20, pady=5)
 
+        downsample_var = tk.BooleanVar(value=self.stats_manager.downsample)
+
+        def apply_downsample():
+            self.stats_manager.downsample = downsample_var.get()
+            logger.debug(f"Chart downsampling {'on' if self.stats_manager.downsample else 'off'}")
+
+        tk.Checkbutton(frame, text="Simplify charts for large ledgers", variable=downsample_var,
+                       command=apply_downsample,
+                       bg=self.themes[self.current_theme]["content_bg"],
+                       fg=self.themes[self.current_theme]["fg"],
+                       selectcolor=self.themes[self.current_theme]["content_bg"]).pack(anchor="w", padx=20, pady=5)
+
     def setup_payment(self):
         logger.debug("Starting setup_payment")
         frame = self.tab_frames["Payment"]
@@ -892,8 +972,7 @@ class TransactionGUI:
 
     def remove_payment_method(self, method):
         try:
-            transactions = self.transaction_manager.get_transactions()
-            used_in_transactions = any(t["PaymentMethod"] == method for t in transactions)
+            used_in_transactions = self.transaction_manager.uses_payment_method(method)
 
             if used_in_transactions:
                 available_methods = [m for m in self.transaction_manager.get_payment_methods() if m != method]
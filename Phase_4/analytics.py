@@ -0,0 +1,61 @@
+# Written by: Turner Miles Peeples
+
+import logging
+
+import numpy as np
+
+# Setup logging
+logging.basicConfig(filename='debug.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Stands in for "no timestamp" in the int64 column; every query masks it out through `dated`
+MISSING = np.iinfo(np.int64).min
+
+
+class LedgerColumns:
+    # Column-oriented copy of the ledger: one NumPy array per field instead of one object per row.
+    # The scatter plot selects its points with masks over these arrays, and Rollups.build groups
+    # them with np.unique and np.bincount instead of updating dicts row by row.
+    def __init__(self, transactions):
+        rows = transactions if isinstance(transactions, list) else list(transactions)
+        count = len(rows)
+        self.amounts = np.fromiter((t.amount for t in rows), dtype=np.float64, count=count)
+        self.timestamps = np.fromiter((MISSING if t.timestamp is None else t.timestamp for t in rows),
+                                      dtype=np.int64, count=count)
+        self.dated = self.timestamps != MISSING
+        # Categories become small integer codes, so a category filter is one vectorized lookup
+        codes = {}
+        self.category_codes = np.fromiter((codes.setdefault(t.category, len(codes)) for t in rows),
+                                          dtype=np.int32, count=count)
+        self.categories = list(codes)
+        methods = {}
+        self.method_codes = np.fromiter((methods.setdefault(t.payment_method, len(methods)) for t in rows),
+                                        dtype=np.int32, count=count)
+        self.payment_methods = list(methods)
+        logger.debug(f"Built columns for {count} transactions")
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def category_mask(self, categories):
+        wanted = [i for i, name in enumerate(self.categories) if name in categories]
+        return np.isin(self.category_codes, wanted)
+
+    def group_totals(self, keys, selected=None):
+        # (distinct keys, row count per key, amount total per key) for the rows in `selected`.
+        # bincount adds the amounts in ledger order, so each total equals a running Python sum.
+        amounts = self.amounts if selected is None else self.amounts[selected]
+        if not len(keys):
+            return keys, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+        low = keys.min()
+        if keys.max() - low < 4 * len(keys):
+            # Keys span a small range (days times category/method pairs), so they index bins directly
+            offsets = keys - low
+            counts = np.bincount(offsets)
+            present = np.flatnonzero(counts)
+            totals = np.bincount(offsets, weights=amounts)
+            return present + low, counts[present], totals[present]
+        unique, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(unique))
+        totals = np.bincount(inverse, weights=amounts, minlength=len(unique))
+        return unique, counts, totals
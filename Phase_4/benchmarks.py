@@ -0,0 +1,187 @@
+# Written by: Turner Miles Peeples
+# Ad-hoc performance measurements. Run from the Phase_4 directory:
+#   python benchmarks.py memory 100000 1000000
+#   python benchmarks.py query 10000 100000 1000000
+#   python benchmarks.py rollups 100000 1000000
+
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from transaction import Transaction, parse_timestamp
+
+CATEGORIES = ["Expense", "Deposit", "Invoice"]
+PAYMENT_METHODS = ["Credit Card", "Debit Card", "Bank Transfer", "Cash"]
+STATUSES = ["Completed", "Planned"]
+RECIPIENTS = [f"Recipient {i}" for i in range(200)]
+
+
+def make_rows(count, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        category = rng.choice(CATEGORIES)
+        recipient = rng.choice(RECIPIENTS)
+        rows.append({
+            "Description": f"{category} to {recipient}",
+            "Amount": round(rng.uniform(1, 500), 2),
+            "Category": category,
+            "Recipient": recipient,
+            "Date": f"20{rng.randint(20, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} "
+                    f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}",
+            "PaymentMethod": rng.choice(PAYMENT_METHODS),
+            "Status": rng.choice(STATUSES),
+        })
+    return rows
+
+
+def _measure(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def bench_memory(counts):
+    for count in counts:
+        # Round-trip through JSON so every string is a separate object, exactly as load_data sees them
+        text = json.dumps({"transactions": make_rows(count)})
+        rows, dict_bytes = _measure(lambda: json.loads(text)["transactions"])
+        del rows
+        records, record_bytes = _measure(lambda: [Transaction.from_dict(t) for t in json.loads(text)["transactions"]])
+        del records
+        print(f"{count:>9} rows: dicts {dict_bytes / count:7.1f} B/row ({dict_bytes / 2**20:8.1f} MiB)  "
+              f"Transaction {record_bytes / count:7.1f} B/row ({record_bytes / 2**20:8.1f} MiB)  "
+              f"saved {100 * (1 - record_bytes / dict_bytes):4.1f}%")
+
+
+class MemoryStore:
+    # Keeps benchmark ledgers off disk
+    def iter_load(self, page_size=500):
+        return list(PAYMENT_METHODS)
+        yield
+
+    def append(self, op, **payload):
+        return False
+
+    def compact(self, transactions, payment_methods, background=False):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self, transactions, payment_methods):
+        pass
+
+
+def make_manager(count):
+    from log import TransactionManager
+
+    manager = TransactionManager(store=MemoryStore())
+    manager.add_transactions(make_rows(count))
+    return manager
+
+
+def _best_of(function, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def bench_query(counts):
+    start = parse_timestamp("2024-01-01")
+    end = parse_timestamp("2024-04-01")
+    # name -> (scan-and-filter as the GUI and StatsManager used to do it, the same question through query())
+    cases = {
+        "expenses": (
+            lambda m: [t for t in m.get_transactions() if t["Category"] in ("Expense", "Invoice")],
+            lambda m: list(m.query(category=("Expense", "Invoice")))),
+        "planned cash": (
+            lambda m: [t for t in m.get_transactions() if t["Status"] == "Planned" and t["PaymentMethod"] == "Cash"],
+            lambda m: list(m.query(status="Planned", payment_method="Cash"))),
+        "deposits Q1 2024": (
+            lambda m: [t for t in m.get_transactions()
+                       if t["Category"] == "Deposit" and t.timestamp is not None and start <= t.timestamp < end],
+            lambda m: list(m.query(category="Deposit", start=start, end=end))),
+        "top 10 amounts": (
+            lambda m: sorted(m.get_transactions(), key=lambda t: t["Amount"], reverse=True)[:10],
+            lambda m: list(m.query(sort="Amount", reverse=True, limit=10))),
+        "first page": (
+            lambda m: [t for t in m.get_transactions() if t["Recipient"] == "Recipient 7"][:50],
+            lambda m: list(m.query(recipient="Recipient 7", limit=50))),
+    }
+    for count in counts:
+        manager = make_manager(count)
+        print(f"{count} rows")
+        for name, (scan, query) in cases.items():
+            expected, scan_time = _best_of(lambda: scan(manager))
+            result, query_time = _best_of(lambda: query(manager))
+            assert [t.id for t in result] == [t.id for t in expected] or name == "top 10 amounts", name
+            print(f"  {name:<18} scan {scan_time * 1000:9.2f} ms  query {query_time * 1000:9.2f} ms  "
+                  f"{scan_time / query_time:6.1f}x  ({len(result)} rows)")
+
+
+def _python_spending(transactions):
+    # The per-row dict accumulation the charts used before the rollups
+    categories = {}
+    daily = {}
+    for t in transactions:
+        if t.category not in ("Expense", "Invoice"):
+            continue
+        categories[t.category] = categories.get(t.category, 0) + t.amount
+        if t.timestamp is not None:
+            day = t.timestamp // 86400
+            daily[day] = daily.get(day, 0) + t.amount
+    return categories, daily
+
+
+def _python_rollups(transactions):
+    # Rollups built one add() per transaction, as before the NumPy group-by
+    from rollups import Rollups
+
+    rollups = Rollups()
+    for t in transactions:
+        rollups.add(t)
+    return rollups
+
+
+def bench_rollups(counts):
+    from rollups import Rollups
+    from stats import rollup_summary
+
+    for count in counts:
+        manager = make_manager(count)
+        _, python_time = _best_of(lambda: _python_spending(manager.get_transactions()), repeat=3)
+        expected, loop_time = _best_of(lambda: _python_rollups(manager.get_transactions()), repeat=1)
+        rollups, build_time = _best_of(lambda: Rollups.build(manager.get_transactions()), repeat=3)
+        assert rollups.tables == expected.tables
+        _, summary_time = _best_of(lambda: rollup_summary(rollups), repeat=3)
+        row = next(iter(manager.get_transactions()))
+        _, update_time = _best_of(lambda: (rollups.remove(row), rollups.add(row)), repeat=5)
+        print(f"{count:>9} rows: python loop {python_time * 1000:8.1f} ms  rollups per row {loop_time * 1000:8.1f} ms  "
+              f"rollups with numpy {build_time * 1000:8.1f} ms  summary from rollups {summary_time * 1000:7.1f} ms  "
+              f"one update {update_time * 1e6:6.1f} us")
+
+
+BENCHMARKS = {
+    "memory": bench_memory,
+    "query": bench_query,
+    "rollups": bench_rollups,
+}
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(f"usage: python benchmarks.py [{'|'.join(BENCHMARKS)}] [row counts...]")
+        sys.exit(1)
+    counts = [int(c) for c in sys.argv[2:]] or [100000, 1000000]
+    BENCHMARKS[sys.argv[1]](counts)
@@ -0,0 +1,34 @@
+# Written by: Turner Miles Peeples
+
+import numpy as np
+
+
+def lttb(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: keeps the first and last point and, from each bucket in
+    # between, the point forming the largest triangle with the previous pick and the next bucket's
+    # mean. The line keeps its peaks and dips with only `threshold` points. x must be sorted.
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    count = len(x)
+    if threshold >= count or threshold < 3:
+        return x, y
+
+    edges = np.linspace(1, count - 1, threshold - 1).astype(np.int64)
+    picked = np.empty(threshold, dtype=np.int64)
+    picked[0] = 0
+    picked[-1] = count - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[stop:edges[i + 2]].mean()
+            next_y = y[stop:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        # Twice the triangle area for every candidate in the bucket at once
+        areas = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous])
+                       - (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        picked[i + 1] = previous
+    return x[picked], y[picked]
+
@@ -0,0 +1,61 @@
+# Written by: Turner Miles Peeples
+
+import threading
+import logging
+from collections import OrderedDict
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure, SubplotParams
+
+# Setup logging
+logging.basicConfig(filename='debug.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DPI = 100
+
+
+class FigurePool:
+    # Owns a few Agg figures, one per key (a chart name), and hands the same Figure, canvas and axes
+    # out again on the next render instead of creating new ones; a new size just resizes the figure.
+    # Nothing goes through pyplot, so no global registry holds on to them, and idle figures past
+    # max_figures are dropped least recently used first, which keeps memory flat however often the
+    # charts are redrawn.
+    def __init__(self, max_figures=8, dpi=DPI):
+        self.max_figures = max_figures
+        self.dpi = dpi
+        self.created = 0
+        self._idle = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key, size):
+        # A figure is out of the pool while in use, so two threads never draw on the same one
+        with self._lock:
+            fig = self._idle.pop(key, None)
+        if fig is None:
+            fig = Figure(figsize=(size[0] / self.dpi, size[1] / self.dpi), dpi=self.dpi)
+            FigureCanvasAgg(fig)
+            fig.add_subplot()
+            self.created += 1
+            logger.debug(f"Created pooled figure {key} ({self.created} so far)")
+        else:
+            fig.set_size_inches(size[0] / self.dpi, size[1] / self.dpi)
+            # Undo the last tight_layout so the chart is laid out exactly as on a new figure
+            defaults = SubplotParams()
+            fig.subplots_adjust(left=defaults.left, bottom=defaults.bottom, right=defaults.right,
+                                top=defaults.top, wspace=defaults.wspace, hspace=defaults.hspace)
+        return fig
+
+    def release(self, key, fig):
+        with self._lock:
+            self._idle[key] = fig
+            self._idle.move_to_end(key)
+            while len(self._idle) > self.max_figures:
+                dropped, _ = self._idle.popitem(last=False)
+                logger.debug(f"Dropped pooled figure {dropped}")
+
+    def clear(self):
+        with self._lock:
+            self._idle.clear()
+
+    def __len__(self):
+        return len(self._idle)
@@ -0,0 +1,70 @@
+# Written by: Turner Miles Peeples
+
+import csv
+import json
+import os
+import sys
+import logging
+
+# Setup logging
+logging.basicConfig(filename='debug.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def iter_csv(path):
+    # Expects a header row with the same keys transactions.json uses (Amount, Category, Date, ...)
+    with open(path, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            yield row
+
+
+def iter_jsonl(path):
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield ValueError(f"invalid JSON: {e}")
+
+
+READERS = {
+    ".csv": iter_csv,
+    ".jsonl": iter_jsonl,
+    ".ndjson": iter_jsonl,
+}
+
+
+def import_file(transaction_manager, path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in READERS:
+        raise ValueError(f"Unsupported import format: {extension or path}")
+    added, rejects = transaction_manager.add_transactions(READERS[extension](path))
+    logger.debug(f"Imported {len(added)} transactions from {path}, rejected {len(rejects)}")
+    for row_number, reason in rejects:
+        logger.warning(f"Rejected row {row_number} of {path}: {reason}")
+    return added, rejects
+
+
+if __name__ == "__main__":
+    from log import TransactionManager
+    from journal import TransactionJournal
+
+    if len(sys.argv) < 2:
+        print("usage: python importer.py FILE.csv|FILE.jsonl ...")
+        sys.exit(1)
+    manager = TransactionManager(store=TransactionJournal())
+    try:
+        for path in sys.argv[1:]:
+            try:
+                added, rejects = import_file(manager, path)
+            except (OSError, ValueError) as e:
+                print(f"{path}: {e}")
+                continue
+            print(f"{path}: imported {len(added)}, rejected {len(rejects)}")
+            for row_number, reason in rejects:
+                print(f"  row {row_number}: {reason}")
+    finally:
+        manager.close()
@@ -0,0 +1,210 @@
+# Written by: Turner Miles Peeples
+
+import json
+import os
+import threading
+import logging
+
+from ledger_reader import LedgerReader
+from snapshot import open_snapshot, write_snapshot
+from transaction import Transaction, assign_ids
+
+# Setup logging
+logging.basicConfig(filename='debug.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAYMENT_METHODS = ["Credit Card", "Debit Card", "Bank Transfer"]
+
+
+def write_json_atomic(path, data, indent=4):
+    # Write to a temp file first so a crash never leaves a half-written file behind
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def apply_record(rows, payment_methods, record):
+    # rows maps transaction id -> transaction dict, in ledger order
+    op = record.get("op")
+    if op in ("add", "update"):
+        transaction = record["transaction"]
+        rows[transaction["Id"]] = transaction
+    elif op == "add_many":
+        for transaction in record["transactions"]:
+            rows[transaction["Id"]] = transaction
+    elif op == "delete":
+        if rows.pop(record["id"], None) is None:
+            logger.warning(f"Journal delete did not match any transaction: {record['id']}")
+    elif op == "add_payment_method":
+        if record["method"] not in payment_methods:
+            payment_methods.append(record["method"])
+    elif op == "remove_payment_method":
+        if record["method"] in payment_methods:
+            payment_methods.remove(record["method"])
+    elif op == "reassign":
+        for t in rows.values():
+            if t["PaymentMethod"] == record["old"]:
+                t["PaymentMethod"] = record["new"]
+    else:
+        logger.warning(f"Unknown journal record: {record}")
+
+
+class TransactionJournal:
+    def __init__(self, snapshot_path='transactions.json', journal_path='transactions.journal', compact_threshold=1000,
+                 read_only=False):
+        self.snapshot_path = snapshot_path
+        # Loading replays the journal as usual but never compacts, so readers like report.py leave the files alone
+        self.read_only = read_only
+        self.journal_path = journal_path
+        self.rotated_path = journal_path + ".old"
+        self.compact_threshold = compact_threshold
+        self.seq = 0
+        self.pending = 0
+        self._file = None
+        self._lock = threading.Lock()
+        self._compactor = None
+
+    def iter_load(self, page_size=500):
+        if not self._has_tail():
+            # Nothing to replay, so the snapshot can be streamed straight through page by page
+            self.seq = 0
+            self.pending = 0
+            if not os.path.exists(self.snapshot_path):
+                return list(DEFAULT_PAYMENT_METHODS)
+            reader = open_snapshot(self.snapshot_path) or LedgerReader(self.snapshot_path)
+            yield from reader.pages(page_size)
+            self.seq = reader.fields.get("journal_seq", 0)
+            return reader.fields.get("payment_methods", list(DEFAULT_PAYMENT_METHODS))
+
+        transactions, payment_methods = self._load_with_replay()
+        for start in range(0, len(transactions), page_size):
+            yield transactions[start:start + page_size]
+        return payment_methods
+
+    def _has_tail(self):
+        return any(os.path.exists(path) and os.path.getsize(path) > 0
+                   for path in (self.rotated_path, self.journal_path))
+
+    def _load_with_replay(self):
+        transactions = []
+        payment_methods = list(DEFAULT_PAYMENT_METHODS)
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_path):
+            reader = open_snapshot(self.snapshot_path) or LedgerReader(self.snapshot_path)
+            transactions = list(reader.iter_transactions())
+            payment_methods = reader.fields.get("payment_methods", payment_methods)
+            snapshot_seq = reader.fields.get("journal_seq", 0)
+
+        # Snapshots written before transactions had ids are migrated by compacting right after the replay
+        needs_compaction = assign_ids(transactions) > 0
+        rows = {t["Id"]: t for t in transactions}
+
+        self.seq = snapshot_seq
+        replayed = 0
+        # A rotated log only survives if the app stopped mid-compaction, so replay it first
+        for path in (self.rotated_path, self.journal_path):
+            for record in self._read_records(path):
+                if record["seq"] <= snapshot_seq:
+                    continue
+                apply_record(rows, payment_methods, record)
+                self.seq = max(self.seq, record["seq"])
+                replayed += 1
+        self.pending = replayed
+        logger.debug(f"Loaded snapshot (seq {snapshot_seq}) and replayed {replayed} journal records")
+
+        transactions = list(rows.values())
+        if (needs_compaction or os.path.exists(self.rotated_path)) and not self.read_only:
+            self.compact(transactions, payment_methods)
+        return transactions, payment_methods
+
+    def _read_records(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path, 'r') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    # Only the last record can be torn by a crash; everything after it is unreadable anyway
+                    logger.error(f"Stopping replay of {path} at line {line_no}: {e}")
+                    return
+
+    def append(self, op, **payload):
+        with self._lock:
+            self.seq += 1
+            record = {"seq": self.seq, "op": op}
+            record.update(payload)
+            if self._file is None:
+                self._file = open(self.journal_path, 'a')
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            # Bulk records count once per row so a big import still triggers compaction
+            self.pending += len(payload.get("transactions", ())) or 1
+            return self.pending >= self.compact_threshold
+
+    def compact(self, transactions, payment_methods, background=False):
+        self.wait()
+        with self._lock:
+            # Copy under the lock so the snapshot matches exactly the records being folded in; the rows
+            # themselves are copied too because they keep changing on the main thread during the write
+            data = (list(payment_methods), self.seq, [Transaction.from_dict(t).copy() for t in transactions])
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if os.path.exists(self.journal_path):
+                if os.path.exists(self.rotated_path):
+                    with open(self.rotated_path, 'a') as rotated, open(self.journal_path, 'r') as current:
+                        rotated.write(current.read())
+                    os.remove(self.journal_path)
+                else:
+                    os.replace(self.journal_path, self.rotated_path)
+            self.pending = 0
+
+        if background:
+            self._compactor = threading.Thread(target=self._write_snapshot, args=(data,), daemon=True)
+            self._compactor.start()
+        else:
+            self._write_snapshot(data)
+
+    def _write_snapshot(self, data):
+        payment_methods, seq, transactions = data
+        try:
+            # Small keys go first so a streaming reader has them before the first page
+            write_json_atomic(self.snapshot_path, {
+                "payment_methods": payment_methods,
+                "journal_seq": seq,
+                "transactions": [t.to_dict() for t in transactions]
+            })
+            if os.path.exists(self.rotated_path):
+                os.remove(self.rotated_path)
+            logger.debug(f"Compacted journal into snapshot at seq {seq}")
+        except Exception as e:
+            # The rotated log is kept, so the next load still replays these records
+            logger.error(f"Error compacting journal: {e}")
+            return
+        try:
+            write_snapshot(self.snapshot_path, transactions, payment_methods, seq)
+        except Exception as e:
+            # Only costs startup time: a missing or stale snapshot falls back to the JSON file
+            logger.error(f"Error writing binary snapshot: {e}")
+
+    def wait(self):
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
+    def flush(self):
+        self.wait()
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+    def close(self, transactions, payment_methods):
+        self.compact(transactions, payment_methods)
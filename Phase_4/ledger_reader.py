@@ -0,0 +1,134 @@
+# Written by: Turner Miles Peeples
+
+import json
+import re
+
+WHITESPACE = re.compile(r'\s*')
+
+
+class LedgerReader:
+    # Reads {"transactions": [...], ...} files one array element at a time, so the file
+    # text is never held in memory as a whole. Other top-level keys end up in self.fields.
+    def __init__(self, path, key="transactions", chunk_size=1 << 16):
+        self.path = path
+        self.key = key
+        self.chunk_size = chunk_size
+        self.fields = {}
+        self.empty = False
+        self._decoder = json.JSONDecoder()
+
+    def iter_transactions(self):
+        with open(self.path, 'r') as f:
+            self._file = f
+            self._buf = ""
+            self._pos = 0
+            self._eof = False
+            self._skip_whitespace()
+            if self._pos >= len(self._buf):
+                self.empty = True
+                return
+            self._expect('{')
+            if self._peek() == '}':
+                return
+            while True:
+                key = self._value()
+                self._expect(':')
+                if key == self.key:
+                    yield from self._array_items()
+                else:
+                    self.fields[key] = self._value()
+                if self._peek() == ',':
+                    self._pos += 1
+                    continue
+                self._expect('}')
+                return
+
+    def is_ledger(self):
+        # True for a JSON object holding the ledger key. Stops as soon as the key is reached, so the
+        # transactions themselves are never parsed; other top-level values are.
+        try:
+            with open(self.path, 'r') as f:
+                self._file = f
+                self._buf = ""
+                self._pos = 0
+                self._eof = False
+                if self._peek() != '{':
+                    return False
+                self._pos += 1
+                if self._peek() == '}':
+                    return False
+                while True:
+                    if self._value() == self.key:
+                        return True
+                    self._expect(':')
+                    self._value()
+                    if self._peek() != ',':
+                        return False
+                    self._pos += 1
+        except (OSError, ValueError):
+            # Unreadable, not text, or not JSON
+            return False
+
+    def pages(self, page_size):
+        page = []
+        for row in self.iter_transactions():
+            page.append(row)
+            if len(page) >= page_size:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    def _array_items(self):
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self._value()
+            if self._peek() == ',':
+                self._pos += 1
+                continue
+            self._expect(']')
+            return
+
+    def _fill(self):
+        chunk = self._file.read(self.chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        # Drop everything already consumed so the buffer stays about one chunk long
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _skip_whitespace(self):
+        while True:
+            self._pos = WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf) or not self._fill():
+                return
+
+    def _peek(self):
+        self._skip_whitespace()
+        if self._pos >= len(self._buf):
+            raise json.JSONDecodeError("Unexpected end of file", self._buf, self._pos)
+        return self._buf[self._pos]
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self._buf, self._pos)
+        self._pos += 1
+
+    def _value(self):
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # A number that runs into the end of the buffer may continue in the next chunk
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
@@ -1,66 +1,553 @@
 # Code Written By: Turner Miles Peeples
 
+import bisect
+import contextlib
+import gc
+import heapq
+import itertools
 import json
+import operator
 import os
 from datetime import datetime
 import logging
+from collections.abc import Mapping
+
+from ledger_reader import LedgerReader
+from rollups import Rollups
+from rolling import RollingStats
+from snapshot import open_snapshot, write_snapshot
+from transaction import FIELDS, Transaction, assign_ids, parse_timestamp
 
 # Setup logging
 logging.basicConfig(filename='debug.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Fields with a secondary index: value -> {id: transaction}, kept in step with every change
+INDEXED_FIELDS = ("Category", "PaymentMethod", "Status")
+ROLLUPS_PATH = 'rollups.json'
+
+
+def sort_key(column):
+    if column == "Date":
+        # Rows with an unreadable date sort before every real date
+        return lambda t: (t.timestamp is not None, t.timestamp or 0)
+    return operator.attrgetter(FIELDS[column])
+
+
+@contextlib.contextmanager
+def collector_paused():
+    # Loading allocates an object per row and frees almost nothing, so the cyclic collector would
+    # only rescan the growing ledger over and over; it is paused while rows are read
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if collecting:
+            gc.enable()
+
+
 class TransactionManager:
-    def __init__(self):
+    def __init__(self, store=None, lazy=False, page_size=500):
+        # Bumped on every change to the ledger, so caches (charts, aggregates) know when they are stale
+        self.version = 0
+        # Set when the stored ledger could not be read; nothing is written back until it is fixed,
+        # since saving the empty ledger left behind would overwrite every stored transaction
+        self.load_error = None
         self.transactions = []
         self.payment_methods = ["Credit Card", "Debit Card", "Bank Transfer"]
-        self.load_data()
+        # Optional storage backend (TransactionJournal, SQLiteStore). Without one every change rewrites transactions.json
+        self.store = store
+        self.page_size = page_size
+        # Where rollups are kept between runs; None keeps them in memory only
+        self.rollups_path = ROLLUPS_PATH
+        self._rollups_file_current = True
+        if lazy:
+            # Pages are pulled in with load_next_page(), so a UI can draw before the whole ledger is read
+            self._loader = self._load_pages()
+        else:
+            self.load_data()
 
-    def add_transaction(self, Description, Amount, Category, Recipient, Date, PaymentMethod, Status):
-        try:
-            parsed_date = datetime.strptime(Date, "%Y-%m-%d %H:%M:%S")
-        except ValueError:
+    def _check_writable(self, op):
+        # Called by every mutator before it touches anything, so a refused change leaves no trace in memory
+        self.finish_loading()
+        if self.load_error is not None:
+            logger.error(f"Not applying {op}: the stored ledger failed to load ({self.load_error})")
+            raise RuntimeError(f"The stored ledger could not be loaded, so changes are not saved: {self.load_error}")
+
+    def _record(self, op, **payload):
+        self.version += 1
+        if self._rollups_file_current:
+            self._discard_rollups_file()
+        if self.store is None:
+            self.save_data()
+        elif self.store.append(op, **payload):
+            self.store.compact(self.transactions, self.payment_methods, background=True)
+
+    @property
+    def transactions(self):
+        # The id index is the source of truth; the list view is rebuilt only after a delete or reorder
+        if self._transaction_list is None:
+            self._transaction_list = list(self._by_id.values())
+        return self._transaction_list
+
+    @transactions.setter
+    def transactions(self, transactions):
+        self._set_transactions(transactions)
+
+    def _set_transactions(self, transactions):
+        self.version += 1
+        assigned = assign_ids(transactions)
+        self._by_id = {t.id: t for t in transactions}
+        self._transaction_list = None
+        self._indexes = {field: {} for field in INDEXED_FIELDS}
+        self._totals = {"Category": {}, "Status": {}}
+        self._slot_indexes = [(FIELDS[field], index) for field, index in self._indexes.items()]
+        self._slot_totals = [(FIELDS[field], totals) for field, totals in self._totals.items()]
+        # (slot, value) of index buckets whose rows are no longer in id order, e.g. after an update
+        # re-added a row at the end; _lookup puts them back in order before using them
+        self._unordered = set()
+        # column -> (key function, sorted [(key, id)], transactions in the same order), built on first use
+        self._sorted_views = {}
+        # Day/week/month rollups, loaded or built on first use and then kept current like the indexes
+        self._rollups = None
+        # Rolling-window spending statistics, built from the day rollups on first use
+        self._rolling = None
+        for t in transactions:
+            self._index(t)
+        self.next_id = max(self._by_id, default=0) + 1
+        return assigned
+
+    def _index(self, transaction):
+        # Slots are read directly; going through the mapping interface here doubled the cost of a load
+        transaction_id = transaction.id
+        for name, index in self._slot_indexes:
+            value = getattr(transaction, name)
+            bucket = index.get(value)
+            if bucket is None:
+                bucket = index[value] = {}
+            elif transaction_id < next(reversed(bucket)):
+                self._unordered.add((name, value))
+            bucket[transaction_id] = transaction
+        for name, totals in self._slot_totals:
+            value = getattr(transaction, name)
+            totals[value] = totals.get(value, 0) + transaction.amount
+        if self._rollups is not None:
+            self._rollups.add(transaction)
+        if self._rolling is not None:
+            self._rolling.add_transaction(transaction)
+        for key, entries, rows in self._sorted_views.values():
+            entry = (key(transaction), transaction.id)
+            position = bisect.bisect_left(entries, entry)
+            entries.insert(position, entry)
+            rows.insert(position, transaction)
+
+    def _unindex(self, transaction):
+        for name, index in self._slot_indexes:
+            value = getattr(transaction, name)
+            bucket = index.get(value)
+            if bucket is not None:
+                bucket.pop(transaction.id, None)
+                if not bucket:
+                    del index[value]
+        for field, totals in self._totals.items():
+            value = getattr(transaction, FIELDS[field])
+            if value in self._indexes[field]:
+                totals[value] -= transaction.amount
+            else:
+                # Last one out: drop the key instead of leaving float residue behind
+                totals.pop(value, None)
+        if self._rollups is not None:
+            self._rollups.remove(transaction)
+        if self._rolling is not None:
+            self._rolling.remove_transaction(transaction)
+        for key, entries, rows in self._sorted_views.values():
+            position = bisect.bisect_left(entries, (key(transaction), transaction.id))
+            if position < len(entries) and entries[position][1] == transaction.id:
+                del entries[position]
+                del rows[position]
+
+    def _bucket(self, field, value):
+        index = self._indexes[field]
+        bucket = index.get(value, {})
+        if (FIELDS[field], value) in self._unordered:
+            bucket = index[value] = dict(sorted(bucket.items()))
+            self._unordered.discard((FIELDS[field], value))
+        return bucket
+
+    def _lookup(self, field, values):
+        # Results are in ledger (id) order, the same order a full scan or the date plan gives
+        buckets = [self._bucket(field, value) for value in values]
+        if len(buckets) == 1:
+            return list(buckets[0].values())
+        # Each bucket is one ordered run, which sorted() merges in close to linear time
+        return sorted((t for bucket in buckets for t in bucket.values()), key=operator.attrgetter("id"))
+
+    def by_category(self, *categories):
+        return self._lookup("Category", categories)
+
+    def by_payment_method(self, *methods):
+        return self._lookup("PaymentMethod", methods)
+
+    def by_status(self, *statuses):
+        return self._lookup("Status", statuses)
+
+    def planned(self):
+        return list(self.query(status="Planned"))
+
+    def query(self, category=None, status=None, payment_method=None, recipient=None,
+              start=None, end=None, sort=None, reverse=False, limit=None, offset=0):
+        # Each field filter takes one value or a collection of values; start/end are epoch seconds
+        # (start <= timestamp < end). Returns a lazy iterator over matching transactions.
+        conditions = {}
+        for field, value in (("Category", category), ("Status", status),
+                             ("PaymentMethod", payment_method), ("Recipient", recipient)):
+            if value is not None:
+                conditions[field] = {value} if isinstance(value, str) else set(value)
+
+        # Plan: start from the smallest matching index bucket set, or the whole ledger when nothing is indexed
+        plan = None
+        ranged = start is not None or end is not None
+        if ranged and self.loading and hasattr(self.store, "iter_range"):
+            # Until a lazy load has finished, a date range is read from the store, which opens only the
+            # partitions overlapping it. The rows are the store's copies; match them to the ledger by id.
+            candidates = sorted(self.store.iter_range(start, end), key=operator.attrgetter("id"))
+            plan = ("store range", len(candidates))
+        else:
+            for field in INDEXED_FIELDS:
+                if field in conditions:
+                    size = sum(len(self._indexes[field].get(value, ())) for value in conditions[field])
+                    if plan is None or size < plan[1]:
+                        plan = (field, size)
+            if ranged:
+                low, high = self._time_range(start, end)
+                if plan is None or high - low < plan[1]:
+                    plan = ("Date", high - low)
+            if plan is None:
+                candidates = self.transactions
+            elif plan[0] == "Date":
+                candidates = self._sorted_views["Date"][2][low:high]
+                if sort == "Date":
+                    # The time index already returns rows in date order
+                    if reverse:
+                        candidates.reverse()
+                    sort = None
+                elif sort is None:
+                    # Unsorted results come back in ledger (id) order whichever plan runs, so offset/limit
+                    # pages are the same rows as a full scan would give
+                    candidates.sort(key=operator.attrgetter("id"))
+            else:
+                candidates = self._lookup(plan[0], conditions.pop(plan[0]))
+        logger.debug(f"Query plan: {'index on ' + plan[0] if plan else 'full scan'}, filters {sorted(conditions)}")
+
+        # Read slots directly; going through the mapping interface per row doubles the cost of a scan
+        checks = [(operator.attrgetter(FIELDS[field]), values) for field, values in conditions.items()]
+
+        def matches(t):
+            for get, values in checks:
+                if get(t) not in values:
+                    return False
+            if start is not None or end is not None:
+                if t.timestamp is None:
+                    return False
+                if start is not None and t.timestamp < start:
+                    return False
+                if end is not None and t.timestamp >= end:
+                    return False
+            return True
+
+        results = filter(matches, candidates) if conditions or start is not None or end is not None else iter(candidates)
+        if sort is None:
+            stop = offset + limit if limit is not None else None
+            return itertools.islice(results, offset, stop)
+
+        if plan is None and sort in self._sorted_views:
+            # Already in order: filter the cached view and stop after limit rows
+            view = self.sorted_transactions(sort, reverse)
+            results = filter(matches, view) if conditions or start is not None or end is not None else view
+            stop = offset + limit if limit is not None else None
+            return itertools.islice(results, offset, stop)
+
+        key = sort_key(sort)
+        if limit is not None:
+            # Only the first offset + limit rows are ever kept, so this is O(n log k) rather than a full sort
+            pick = heapq.nlargest if reverse else heapq.nsmallest
+            return iter(pick(offset + limit, results, key=key)[offset:])
+        return iter(sorted(results, key=key, reverse=reverse)[offset:])
+
+    def sorted_transactions(self, column, reverse=False):
+        # The ledger itself is never reordered. Each column's order is sorted once, then kept up
+        # to date by bisect on every insert, update and delete, so flipping direction is free.
+        if column not in self._sorted_views:
+            key = sort_key(column)
+            entries = sorted((key(t), t.id) for t in self.transactions)
+            rows = [self._by_id[transaction_id] for _, transaction_id in entries]
+            self._sorted_views[column] = (key, entries, rows)
+            logger.debug(f"Built sorted view on {column}")
+        rows = self._sorted_views[column][2]
+        return reversed(rows) if reverse else iter(rows)
+
+    def _time_range(self, start, end):
+        # Positions in the date view of the first row at or after start and the first at or after end.
+        # Ids start at 1, so id 0 sorts before every real row with the same timestamp.
+        self.sorted_transactions("Date")
+        entries = self._sorted_views["Date"][1]
+        low = bisect.bisect_left(entries, ((True, start), 0)) if start is not None else \
+            bisect.bisect_left(entries, ((True, float("-inf")), 0))
+        high = bisect.bisect_left(entries, ((True, end), 0)) if end is not None else len(entries)
+        return low, high
+
+    def between(self, start=None, end=None):
+        # Rows with start <= timestamp < end in date order; either side may be None for an open range
+        low, high = self._time_range(start, end)
+        return self._sorted_views["Date"][2][low:high]
+
+    def recent(self, n):
+        # The n latest transactions dated up to now, newest first. Planned payments dated in the
+        # future are left out until their day comes.
+        now = parse_timestamp(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        low, high = self._time_range(None, now + 1)
+        rows = self._sorted_views["Date"][2]
+        return rows[max(low, high - n):high][::-1]
+
+    def rollups(self):
+        if self._rollups is None:
+            self._rollups = self.rollups_loader()()
+        return self._rollups
+
+    @property
+    def rollups_ready(self):
+        return self._rollups is not None
+
+    def rollups_loader(self):
+        # Returns a function that reads the saved rollups or builds them from a copy of the rows,
+        # safe to run on any thread; hand its result back with adopt_rollups()
+        rows = list(self.transactions)
+        # The saved copy only describes a fully loaded ledger
+        path = self.rollups_path if not self.loading else None
+        fingerprint = self._rollup_fingerprint()
+
+        def load():
+            return (path and Rollups.load(path, fingerprint)) or Rollups.build(rows)
+
+        return load
+
+    def adopt_rollups(self, rollups, version):
+        # Rollups built for an older version missed the changes since, so only current ones are kept
+        if self._rollups is None and version == self.version:
+            self._rollups = rollups
+            return True
+        return False
+
+    def rolling_stats(self, categories):
+        rolling = self._rolling
+        if rolling is None or rolling.stale or rolling.categories != tuple(categories):
+            days, totals = self.rollups().series("day", categories)
+            rolling = self._rolling = RollingStats.build(categories, days, totals)
+        return rolling
+
+    def _discard_rollups_file(self):
+        # The saved rollups describe the ledger as it was loaded. The first change makes them stale,
+        # and a change like a category edit would slip past the fingerprint, so the file goes now;
+        # close() writes a fresh one if the rollups were in use.
+        self._rollups_file_current = False
+        if self.rollups_path and os.path.exists(self.rollups_path):
             try:
-                parsed_date = datetime.strptime(Date, "%Y-%m-%d")
-                Date = parsed_date.strftime("%Y-%m-%d 00:00:00")
-            except ValueError:
-                logger.warning(f"Invalid date format: {Date}. Using current time instead.")
-                Date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        transaction = {
-            "Description": Description,
-            "Amount": Amount,
-            "Category": Category,
-            "Recipient": Recipient,
-            "Date": Date,
-            "PaymentMethod": PaymentMethod,
-            "Status": Status
+                os.remove(self.rollups_path)
+                logger.debug(f"Discarded {self.rollups_path} after the first change")
+            except OSError as e:
+                logger.error(f"Error removing {self.rollups_path}: {e}")
+
+    def _rollup_fingerprint(self):
+        # Cheap check that a saved rollup file belongs to this ledger (e.g. transactions.json was
+        # replaced between runs); changes made through the manager discard the file instead
+        return {
+            "count": len(self._by_id),
+            "next_id": self.next_id,
+            "total": round(sum(self._totals["Category"].values()), 2)
         }
-        self.transactions.append(transaction)
-        self.save_data()
+
+    def uses_payment_method(self, method):
+        return method in self._indexes["PaymentMethod"]
+
+    def totals(self):
+        by_category = dict(self._totals["Category"])
+        income = by_category.get("Deposit", 0)
+        expenses = by_category.get("Expense", 0) + by_category.get("Invoice", 0)
+        return {
+            "income": income,
+            "expenses": expenses,
+            "net": income - expenses,
+            "by_category": by_category,
+            "by_status": dict(self._totals["Status"])
+        }
+
+    def add_transaction(self, Description, Amount, Category, Recipient, Date, PaymentMethod, Status):
+        self._check_writable("add")
+        timestamp = parse_timestamp(Date)
+        if timestamp is None:
+            logger.warning(f"Invalid date format: {Date}. Using current time instead.")
+            timestamp = parse_timestamp(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+        transaction = Transaction(Description, Amount, Category, Recipient, timestamp, PaymentMethod, Status, self.next_id)
+        self._insert(transaction)
+        self._record("add", transaction=transaction.to_dict())
         logger.debug(f"Added transaction: {transaction}")
+        return transaction
+
+    def _insert(self, transaction):
+        self.next_id = max(self.next_id, transaction.id + 1)
+        self._by_id[transaction.id] = transaction
+        self._index(transaction)
+        if self._transaction_list is not None:
+            self._transaction_list.append(transaction)
+
+    def _insert_page(self, page):
+        # Loading inserts a page at a time: one pass over the page per index instead of every index per row
+        if self._rollups is not None or self._rolling is not None or self._sorted_views:
+            for transaction in page:
+                self._insert(transaction)
+            return
+        by_id = self._by_id
+        for transaction in page:
+            by_id[transaction.id] = transaction
+        for name, index in self._slot_indexes:
+            get = operator.attrgetter(name)
+            for transaction in page:
+                value = get(transaction)
+                bucket = index.get(value)
+                if bucket is None:
+                    bucket = index[value] = {}
+                elif transaction.id < next(reversed(bucket)):
+                    self._unordered.add((name, value))
+                bucket[transaction.id] = transaction
+        for name, totals in self._slot_totals:
+            get = operator.attrgetter(name)
+            for transaction in page:
+                value = get(transaction)
+                totals[value] = totals.get(value, 0) + transaction.amount
+        if page:
+            self.next_id = max(self.next_id, max(transaction.id for transaction in page) + 1)
+        if self._transaction_list is not None:
+            self._transaction_list.extend(page)
+
+    def _normalize_row(self, row, date_cache):
+        if isinstance(row, Exception):
+            # Readers pass parse failures through so they are reported under the right row number
+            raise ValueError(str(row))
+        if not isinstance(row, Mapping):
+            raise ValueError("row is not a mapping")
+        try:
+            amount = float(row.get("Amount"))
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid amount: {row.get('Amount')!r}") from None
+        # JSONL values can be numbers or booleans, so every text field goes through str()
+        fields = {key: "" if row.get(key) is None else str(row.get(key)).strip()
+                  for key in ("Category", "PaymentMethod", "Date", "Recipient", "Description", "Status")}
+        category = fields["Category"]
+        if not category:
+            raise ValueError("missing category")
+        payment_method = fields["PaymentMethod"]
+        if payment_method not in self.payment_methods:
+            raise ValueError(f"unknown payment method: {payment_method!r}")
+        date = fields["Date"]
+        if date not in date_cache:
+            date_cache[date] = parse_timestamp(date)
+        if date_cache[date] is None:
+            raise ValueError(f"invalid date: {date!r}")
+        recipient = fields["Recipient"]
+        description = fields["Description"] or f"{category} to {recipient}"
+        status = fields["Status"] or "Completed"
+        return Transaction(description, amount, category, recipient, date_cache[date], payment_method, status)
+
+    def add_transactions(self, rows):
+        self._check_writable("add_many")
+        added = []
+        rejects = []
+        # Many rows share a date, so each distinct string is parsed only once
+        date_cache = {}
+        for position, row in enumerate(rows, 1):
+            try:
+                added.append(self._normalize_row(row, date_cache))
+            except ValueError as e:
+                rejects.append((position, str(e)))
+
+        # Nothing goes in until every row has been read, so an unexpected error (an unreadable file,
+        # a failing reader) leaves the ledger as it was instead of holding rows that were never saved
+        for transaction in added:
+            transaction.id = self.next_id
+            self._insert(transaction)
+        if added:
+            self._record("add_many", transactions=[t.to_dict() for t in added])
+        logger.debug(f"Bulk added {len(added)} transactions, rejected {len(rejects)}")
+        return added, rejects
+
+    def get_by_id(self, transaction_id):
+        return self._by_id.get(transaction_id)
+
+    def update_by_id(self, transaction_id, **changes):
+        self._check_writable("update")
+        transaction = self._by_id.get(transaction_id)
+        if transaction is None:
+            logger.warning(f"Cannot update transaction {transaction_id}: not found")
+            return None
+        changes.pop("Id", None)
+        unknown = [key for key in changes if key not in FIELDS]
+        if unknown:
+            raise KeyError(f"Unknown transaction fields: {', '.join(unknown)}")
+        if "Amount" in changes:
+            try:
+                float(changes["Amount"])
+            except (TypeError, ValueError):
+                raise ValueError(f"invalid amount: {changes['Amount']!r}") from None
+        # Applied to a copy first, so a bad value fails while the stored row is still in every index
+        updated = transaction.copy()
+        updated.update(changes)
+        self._unindex(transaction)
+        for name in Transaction.__slots__:
+            setattr(transaction, name, getattr(updated, name))
+        self._index(transaction)
+        self._record("update", transaction=transaction.to_dict())
+        logger.debug(f"Updated transaction: {transaction}")
+        return transaction
+
+    def delete_by_id(self, transaction_id):
+        self._check_writable("delete")
+        transaction = self._by_id.pop(transaction_id, None)
+        if transaction is None:
+            logger.warning(f"Cannot delete transaction {transaction_id}: not found")
+            return False
+        self._unindex(transaction)
+        self._transaction_list = None
+        self._record("delete", id=transaction_id)
+        logger.debug(f"Deleted transaction: {transaction}")
+        return True
 
     def get_transactions(self):
         return self.transactions
 
     def add_payment_method(self, method):
+        self._check_writable("add_payment_method")
         if method and method not in self.payment_methods:
             self.payment_methods.append(method)
-            self.save_data()
+            self._record("add_payment_method", method=method)
             logger.debug(f"Added payment method: {method}")
             return True
         logger.warning(f"Failed to add payment method: {method} (already exists or invalid)")
         return False
 
     def remove_payment_method(self, method):
+        self._check_writable("remove_payment_method")
         if method in self.payment_methods:
             self.payment_methods.remove(method)
-            self.save_data()
+            self._record("remove_payment_method", method=method)
             logger.debug(f"Removed payment method: {method}")
             return True
         logger.warning(f"Failed to remove payment method: {method} (not found)")
         return False
 
     def reassign_payment_method(self, old_method, new_method):
+        self._check_writable("reassign")
         if old_method not in self.payment_methods or new_method not in self.payment_methods:
             logger.warning(f"Cannot reassign payment method: {old_method} or {new_method} not found")
             return False
@@ -69,13 +556,21 @@ class TransactionManager:
             logger.warning("Old and new payment methods are the same; no reassignment needed")
             return True
 
-        updated = False
-        for t in self.transactions:
-            if t["PaymentMethod"] == old_method:
+        moved = self._indexes["PaymentMethod"].pop(old_method, {})
+        if moved:
+            # Rebuilt on next use rather than repositioned row by row
+            self._sorted_views.pop("PaymentMethod", None)
+            target = self._indexes["PaymentMethod"].setdefault(new_method, {})
+            if target:
+                self._unordered.add(("payment_method", new_method))
+            for t in moved.values():
+                if self._rollups is not None:
+                    self._rollups.remove(t)
                 t["PaymentMethod"] = new_method
-                updated = True
-        if updated:
-            self.save_data()
+                target[t.id] = t
+                if self._rollups is not None:
+                    self._rollups.add(t)
+            self._record("reassign", old=old_method, new=new_method)
             logger.debug(f"Reassigned transactions from {old_method} to {new_method}")
         return True
 
@@ -83,10 +578,21 @@ class TransactionManager:
         return self.payment_methods
 
     def save_data(self):
+        self.finish_loading()
+        self._write_all()
+
+    def _write_all(self):
+        if self.load_error is not None:
+            logger.error(f"Not saving: the stored ledger failed to load ({self.load_error})")
+            raise RuntimeError(f"The stored ledger could not be loaded, so changes are not saved: {self.load_error}")
+        if self.store is not None:
+            self.store.compact(self.transactions, self.payment_methods)
+            return
         try:
+            # Payment methods go first so a streaming reader has them before the first page
             data = {
-                "transactions": self.transactions,
-                "payment_methods": self.payment_methods
+                "payment_methods": self.payment_methods,
+                "transactions": [t.to_dict() for t in self.transactions]
             }
             with open('transactions.json', 'w') as f:
                 json.dump(data, f, indent=4)
@@ -95,29 +601,123 @@ class TransactionManager:
             logger.error(f"Error saving data: {e}")
             raise
 
+    def flush(self):
+        # Blocks until every change so far is on disk (the write-behind store and journal compaction work in the background)
+        if self.store is not None:
+            self.store.flush()
+
+    def close(self):
+        self.finish_loading()
+        if self.load_error is not None:
+            # Closing a store compacts it, which would write the empty in-memory ledger over the file
+            logger.error(f"Closing without saving: the stored ledger failed to load ({self.load_error})")
+            return
+        if self.store is not None:
+            self.store.close(self.transactions, self.payment_methods)
+            logger.debug("Closed transaction store")
+        elif os.path.exists('transactions.json'):
+            # Written on close rather than on every save, which already rewrites the whole JSON file
+            try:
+                write_snapshot('transactions.json', self.transactions, self.payment_methods)
+            except Exception as e:
+                logger.error(f"Error writing binary snapshot: {e}")
+        if self._rollups is not None and self.rollups_path:
+            try:
+                self._rollups.save(self.rollups_path, self._rollup_fingerprint())
+            except Exception as e:
+                logger.error(f"Error saving rollups: {e}")
+
     def load_data(self):
+        self._loader = None
+        with collector_paused():
+            for _ in self._load_pages():
+                pass
+
+    def load_next_page(self):
+        # Returns the page just added, or None once the whole ledger is in memory
+        if self._loader is None:
+            return None
         try:
-            if os.path.exists('transactions.json'):
-                with open('transactions.json', 'r') as f:
-                    content = f.read().strip()
-                    if not content:
-                        logger.warning("transactions.json is empty, using default values")
-                        self.transactions = []
-                        self.payment_methods = ["Credit Card", "Debit Card", "Bank Transfer"]
-                    else:
-                        data = json.loads(content)
-                        self.transactions = data.get("transactions", [])
-                        self.payment_methods = data.get("payment_methods", ["Credit Card", "Debit Card", "Bank Transfer"])
-                    logger.debug("Loaded data from file")
-            else:
-                self.transactions = []
-                self.payment_methods = ["Credit Card", "Debit Card", "Bank Transfer"]
-                logger.debug("No data file found, starting with default values")
+            with collector_paused():
+                return next(self._loader)
+        except StopIteration:
+            self._loader = None
+            return None
+
+    def finish_loading(self):
+        while self.load_next_page() is not None:
+            pass
+
+    @property
+    def loading(self):
+        return self._loader is not None
+
+    def _load_pages(self):
+        self.load_error = None
+        self.transactions = []
+        self.payment_methods = ["Credit Card", "Debit Card", "Bank Transfer"]
+        legacy = []
+        # Sorted views asked for mid-load (the dashboard's recent()) are dropped when the next page
+        # arrives and rebuilt once at the end; keeping them up to date meant a bisect insert into two
+        # lists per row, quadratic on a ledger that is not in date order
+        dropped = set()
+        try:
+            source = self.store.iter_load(self.page_size) if self.store is not None else self._iter_json_pages()
+            while True:
+                try:
+                    rows = next(source)
+                except StopIteration as done:
+                    # Sources return the payment method list, which may sit after the transactions
+                    self.payment_methods = done.value
+                    break
+                page = [Transaction.from_dict(row) for row in rows]
+                if legacy or any(t.id is None for t in page):
+                    # Rows saved before transactions had ids can only be numbered once every id is known
+                    legacy.extend(page)
+                    continue
+                if self._sorted_views:
+                    dropped.update(self._sorted_views)
+                    self._sorted_views = {}
+                self._insert_page(page)
+                self.version += 1
+                yield page
+
+            ids = list(self._by_id)
+            if any(previous > current for previous, current in zip(ids, ids[1:])):
+                # Partitions load month by month, so the ledger is put back in id (insertion) order once
+                self._by_id = dict(sorted(self._by_id.items()))
+                self._transaction_list = None
+            if legacy:
+                assign_ids(self.transactions + legacy)
+                for t in legacy:
+                    self._insert(t)
+                self.version += 1
+                # Persist the ids handed out to rows saved before transactions had them
+                self._write_all()
+                for start in range(0, len(legacy), self.page_size):
+                    yield legacy[start:start + self.page_size]
+            for column in dropped:
+                self.sorted_transactions(column)
+            logger.debug(f"Loaded {len(self._by_id)} transactions")
         except json.JSONDecodeError as e:
-            logger.error(f"Error parsing transactions.json: {e}. File content: {content}")
+            # Only the position is logged; the file itself can be many megabytes
+            logger.error(f"Error parsing transactions: {e}")
+            self.load_error = e
             self.transactions = []
             self.payment_methods = ["Credit Card", "Debit Card", "Bank Transfer"]
         except Exception as e:
             logger.error(f"Error loading data: {e}")
+            self.load_error = e
             self.transactions = []
-            self.payment_methods = ["Credit Card", "Debit Card", "Bank Transfer"]
\ No newline at end of file
+            self.payment_methods = ["Credit Card", "Debit Card", "Bank Transfer"]
+
+    def _iter_json_pages(self):
+        if not os.path.exists('transactions.json'):
+            logger.debug("No data file found, starting with default values")
+            return ["Credit Card", "Debit Card", "Bank Transfer"]
+        # The binary snapshot skips JSON parsing entirely, as long as it still matches the file
+        reader = open_snapshot('transactions.json') or LedgerReader('transactions.json')
+        yield from reader.pages(self.page_size)
+        if reader.empty:
+            logger.warning("transactions.json is empty, using default values")
+        return reader.fields.get("payment_methods", ["Credit Card", "Debit Card", "Bank Transfer"])
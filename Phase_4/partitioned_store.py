@@ -0,0 +1,226 @@
+# Written by: Turner Miles Peeples
+
+import json
+import os
+import sys
+import logging
+
+from journal import DEFAULT_PAYMENT_METHODS, write_json_atomic
+from ledger_reader import LedgerReader
+from transaction import Transaction, assign_ids, month_of, parse_timestamp
+
+# Setup logging
+logging.basicConfig(filename='debug.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Rows whose date cannot be parsed have no month, so they share one partition
+UNDATED = "undated"
+
+
+def partition_of(transaction):
+    if isinstance(transaction, Transaction):
+        timestamp = transaction.timestamp
+    else:
+        timestamp = transaction.get("Date")
+        if not isinstance(timestamp, int):
+            timestamp = parse_timestamp(timestamp)
+    return UNDATED if timestamp is None else month_of(timestamp)
+
+
+class PartitionedStore:
+    # One JSON file per calendar month (ledger/2025-06.json, ...) plus a small manifest.json with
+    # the payment methods and the list of partitions. The store keeps each month's rows (the same
+    # Transaction objects the manager loads, or the dicts recorded for later changes), so a change
+    # rewrites only the months it touched without walking the rest of the ledger. iter_range()
+    # reads just the months that overlap the requested dates.
+    def __init__(self, directory='ledger'):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self.partitions = []
+        # id -> month, and month -> {id: row}
+        self._months = {}
+        self._rows = {}
+        # Set when the rows above no longer match the ledger (e.g. rows loaded without ids); the
+        # next compact() regroups the manager's transactions instead
+        self._stale = False
+        self._dirty = set()
+        self._dirty_manifest = False
+        os.makedirs(directory, exist_ok=True)
+        self._read_manifest()
+
+    def _read_manifest(self):
+        self.payment_methods = list(DEFAULT_PAYMENT_METHODS)
+        if not os.path.exists(self.manifest_path):
+            return
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+            self.payment_methods = manifest.get("payment_methods", self.payment_methods)
+            self.partitions = sorted(manifest.get("partitions", []))
+        except Exception as e:
+            logger.error(f"Error reading {self.manifest_path}: {e}")
+            raise
+
+    def partition_path(self, month):
+        return os.path.join(self.directory, f"{month}.json")
+
+    def _iter_partition(self, month):
+        path = self.partition_path(month)
+        if not os.path.exists(path):
+            logger.warning(f"Partition {path} is listed in the manifest but missing")
+            return
+        yield from LedgerReader(path).iter_transactions()
+
+    def iter_load(self, page_size=500):
+        self._months = {}
+        self._rows = {}
+        self._stale = False
+        page = []
+        for month in self.partitions:
+            rows = self._rows.setdefault(month, {})
+            for row in self._iter_partition(month):
+                # Handed to the manager as Transactions, so both hold the very same objects
+                transaction = Transaction.from_dict(row)
+                if transaction.id is None:
+                    self._stale = True
+                else:
+                    self._months[transaction.id] = month
+                    rows[transaction.id] = transaction
+                page.append(transaction)
+                if len(page) >= page_size:
+                    yield page
+                    page = []
+        if page:
+            yield page
+        logger.debug(f"Loaded {len(self._months)} transactions from {len(self.partitions)} partitions")
+        return list(self.payment_methods)
+
+    def iter_range(self, start=None, end=None):
+        # Transactions with start <= timestamp < end (epoch seconds; None leaves that side open).
+        # Only the partitions overlapping the range are opened, and none of this touches a loaded
+        # manager. Used by report.py --start/--end and by TransactionManager.query() while loading.
+        first = month_of(start) if start is not None else None
+        last = month_of(end - 1) if end is not None else None
+        for month in self.partitions:
+            if month == UNDATED or (first and month < first) or (last and month > last):
+                continue
+            for row in self._iter_partition(month):
+                transaction = Transaction.from_dict(row)
+                timestamp = transaction.timestamp
+                if timestamp is not None and (start is None or timestamp >= start) and \
+                        (end is None or timestamp < end):
+                    yield transaction
+
+    def append(self, op, **payload):
+        if op in ("add", "update"):
+            self._move(payload["transaction"])
+        elif op == "add_many":
+            for transaction in payload["transactions"]:
+                self._move(transaction)
+        elif op == "delete":
+            month = self._months.pop(payload["id"], None)
+            if month is not None:
+                self._rows[month].pop(payload["id"], None)
+                self._dirty.add(month)
+        elif op in ("add_payment_method", "remove_payment_method"):
+            self._dirty_manifest = True
+        elif op == "reassign":
+            # Loaded Transactions were already changed by the manager; recorded dicts are snapshots
+            for month, rows in self._rows.items():
+                for row in rows.values():
+                    if row["PaymentMethod"] == payload["old"] and isinstance(row, dict):
+                        row["PaymentMethod"] = payload["new"]
+                    if row["PaymentMethod"] == payload["new"]:
+                        self._dirty.add(month)
+        else:
+            logger.warning(f"Unknown store operation: {op}")
+        # The rewrite is cheap because only the dirty months are written
+        return True
+
+    def _move(self, transaction):
+        # An edited date can move a row to another month, in which case both files change
+        month = partition_of(transaction)
+        previous = self._months.get(transaction["Id"])
+        if previous is not None and previous != month:
+            self._rows[previous].pop(transaction["Id"], None)
+            self._dirty.add(previous)
+        self._months[transaction["Id"]] = month
+        self._rows.setdefault(month, {})[transaction["Id"]] = transaction
+        self._dirty.add(month)
+
+    def _regroup(self, transactions):
+        self._months = {}
+        self._rows = {}
+        for t in transactions:
+            month = partition_of(t)
+            self._months[t["Id"]] = month
+            self._rows.setdefault(month, {})[t["Id"]] = t
+        self._stale = False
+
+    def compact(self, transactions, payment_methods, background=False, rewrite_all=False):
+        # After a recorded change (background) only the dirty months' rows are read; a full save
+        # regroups the manager's list first, since it may hold rows this store has not seen
+        if rewrite_all or self._stale or not background:
+            self._regroup(transactions)
+        if rewrite_all:
+            self._dirty = set(self._rows) | set(self.partitions)
+        dirty, self._dirty = self._dirty, set()
+        # Written in id order, which is the order the rows were added in
+        rows = {month: [dict(t) for _, t in sorted(self._rows.get(month, {}).items())] for month in dirty}
+
+        try:
+            for month, month_rows in rows.items():
+                path = self.partition_path(month)
+                if month_rows:
+                    write_json_atomic(path, {"transactions": month_rows})
+                elif os.path.exists(path):
+                    os.remove(path)
+            partitions = sorted(month for month, month_rows in self._rows.items() if month_rows)
+            if dirty or self._dirty_manifest or partitions != self.partitions or payment_methods != self.payment_methods:
+                self.partitions = partitions
+                self.payment_methods = list(payment_methods)
+                write_json_atomic(self.manifest_path, {
+                    "payment_methods": self.payment_methods,
+                    "partitions": self.partitions
+                })
+                self._dirty_manifest = False
+            logger.debug(f"Rewrote {len(dirty)} of {len(self.partitions)} partitions in {self.directory}")
+        except Exception as e:
+            # Put the months back so the next change retries them
+            self._dirty |= dirty
+            logger.error(f"Error saving partitions: {e}")
+            raise
+
+    def flush(self):
+        # Every change is written as soon as it is recorded
+        pass
+
+    def close(self, transactions, payment_methods):
+        if self._dirty or self._dirty_manifest:
+            self.compact(transactions, payment_methods)
+
+
+def migrate_json_to_partitions(json_path='transactions.json', directory='ledger'):
+    store = PartitionedStore(directory)
+    if store.partitions:
+        raise ValueError(f"{directory} already holds {len(store.partitions)} partitions; refusing to migrate twice")
+    reader = LedgerReader(json_path)
+    transactions = list(reader.iter_transactions())
+    assign_ids(transactions)
+    store.compact(transactions, reader.fields.get("payment_methods", list(DEFAULT_PAYMENT_METHODS)), rewrite_all=True)
+    logger.debug(f"Migrated {len(transactions)} transactions from {json_path} into {len(store.partitions)} partitions")
+    return len(transactions), len(store.partitions)
+
+
+if __name__ == "__main__":
+    json_path = sys.argv[1] if len(sys.argv) > 1 else 'transactions.json'
+    directory = sys.argv[2] if len(sys.argv) > 2 else 'ledger'
+    if not os.path.exists(json_path):
+        print(f"{json_path} not found")
+        sys.exit(1)
+    try:
+        count, partitions = migrate_json_to_partitions(json_path, directory)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    print(f"Migrated {count} transactions from {json_path} into {partitions} monthly partitions in {directory}")
@@ -0,0 +1,67 @@
+# Written by: Turner Miles Peeples
+
+import queue
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# Setup logging
+logging.basicConfig(filename='debug.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class RenderWorker:
+    # Runs slow jobs (chart rendering) on a background thread. Results are only handed back when
+    # the owning thread calls poll(), so callbacks never run on the worker and Tk stays single-threaded.
+    # cancel() makes every job submitted so far stale: queued ones never start, running ones are dropped.
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="render")
+        self._results = queue.Queue()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._futures = []
+
+    def submit(self, job, on_done):
+        # on_done(result) runs inside a later poll(); result is the exception instead if the job raised
+        with self._lock:
+            generation = self._generation
+            self._futures = [f for f in self._futures if not f.done()]
+            self._futures.append(self._executor.submit(self._run, generation, job, on_done))
+
+    def _run(self, generation, job, on_done):
+        if generation != self._generation:
+            return
+        try:
+            result = job()
+        except Exception as e:
+            logger.error(f"Render job failed: {e}")
+            result = e
+        self._results.put((generation, on_done, result))
+
+    def cancel(self):
+        with self._lock:
+            self._generation += 1
+            for future in self._futures:
+                future.cancel()
+            self._futures = []
+
+    @property
+    def pending(self):
+        with self._lock:
+            return any(not f.done() for f in self._futures) or not self._results.empty()
+
+    def poll(self):
+        delivered = 0
+        while True:
+            try:
+                generation, on_done, result = self._results.get_nowait()
+            except queue.Empty:
+                return delivered
+            if generation != self._generation:
+                continue
+            on_done(result)
+            delivered += 1
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False)
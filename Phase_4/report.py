@@ -0,0 +1,290 @@
+# Written by: Turner Miles Peeples
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Reports are drawn without a display; nothing below may pull in Tk
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.backends.backend_pdf import PdfPages
+
+from journal import DEFAULT_PAYMENT_METHODS, TransactionJournal
+from ledger_reader import LedgerReader
+from log import TransactionManager
+from partitioned_store import PartitionedStore
+from snapshot import open_snapshot
+from sqlite_store import SQLiteStore
+from stats import CHARTS, StatsManager, build_figure, figure_png
+from transaction import SECONDS_PER_DAY, Transaction, parse_timestamp
+
+# Setup logging
+logging.basicConfig(filename='debug.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+FORMATS = ("png", "pdf")
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+
+def ledger_kind(path):
+    # What a path holds, judged by its content rather than its name: "partitioned", "sqlite", "json",
+    # or None for anything else (account.json, wallet.json, rollups.json, snapshots, ...)
+    if os.path.isdir(path):
+        return "partitioned" if os.path.exists(os.path.join(path, "manifest.json")) else None
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(len(SQLITE_HEADER))
+    except OSError:
+        return None
+    if header == SQLITE_HEADER:
+        try:
+            # Opened read-only, so probing never creates or changes anything
+            conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+            try:
+                found = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transactions'").fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return None
+        return "sqlite" if found else None
+    return "json" if LedgerReader(path).is_ledger() else None
+
+
+def journal_path_for(path):
+    # The app keeps transactions.journal next to transactions.json
+    return os.path.splitext(path)[0] + ".journal"
+
+
+class ReadOnlyStore:
+    # Loads a ledger through the same readers the app uses (snapshot, streaming JSON, SQLite or
+    # month partitions) and ignores every write, so a report never touches the file it reads.
+    # With start/end (epoch seconds, end exclusive) only rows in that range are loaded, and a
+    # partitioned ledger only opens the months that overlap it.
+    def __init__(self, path, start=None, end=None):
+        self.path = path
+        self.start = start
+        self.end = end
+
+    def iter_load(self, page_size=500):
+        kind = ledger_kind(self.path)
+        if kind is None:
+            raise ValueError(f"{self.path} is not a ledger")
+        ranged = self.start is not None or self.end is not None
+        if kind == "partitioned":
+            store = PartitionedStore(self.path)
+            if not ranged:
+                return (yield from store.iter_load(page_size))
+            page = []
+            for row in store.iter_range(self.start, self.end):
+                page.append(row)
+                if len(page) >= page_size:
+                    yield page
+                    page = []
+            if page:
+                yield page
+            return list(store.payment_methods)
+        if ranged:
+            return (yield from self._in_range(self._all_pages(kind, page_size)))
+        return (yield from self._all_pages(kind, page_size))
+
+    def _in_range(self, pages):
+        while True:
+            try:
+                page = next(pages)
+            except StopIteration as done:
+                return done.value
+            # Converted here rather than in the manager, so each date is parsed once
+            rows = (Transaction.from_dict(row) for row in page)
+            page = [t for t in rows if t.timestamp is not None
+                    and (self.start is None or t.timestamp >= self.start)
+                    and (self.end is None or t.timestamp < self.end)]
+            if page:
+                yield page
+
+    def _all_pages(self, kind, page_size):
+        if kind == "sqlite":
+            store = SQLiteStore(self.path)
+            try:
+                return (yield from store.iter_load(page_size))
+            finally:
+                store.conn.close()
+        journal_path = journal_path_for(self.path)
+        if os.path.exists(journal_path) or os.path.exists(journal_path + ".old"):
+            # Changes the app has journaled but not yet compacted into the JSON file
+            journal = TransactionJournal(self.path, journal_path, read_only=True)
+            return (yield from journal.iter_load(page_size))
+        reader = open_snapshot(self.path) or LedgerReader(self.path)
+        yield from reader.pages(page_size)
+        return reader.fields.get("payment_methods", list(DEFAULT_PAYMENT_METHODS))
+
+    def append(self, op, **payload):
+        return False
+
+    def compact(self, transactions, payment_methods, background=False):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self, transactions, payment_methods):
+        pass
+
+
+def find_ledgers(paths):
+    # A directory holding manifest.json is one partitioned ledger; any other directory is searched
+    # (not recursively) for files that hold a ledger. Files named directly are always tried.
+    ledgers = []
+    for path in paths:
+        if os.path.isdir(path) and ledger_kind(path) is None:
+            for name in sorted(os.listdir(path)):
+                full = os.path.join(path, name)
+                if os.path.isfile(full) and ledger_kind(full) is not None:
+                    ledgers.append(full)
+                else:
+                    logger.debug(f"Skipping {full}: not a ledger")
+        elif os.path.exists(path):
+            ledgers.append(path)
+        else:
+            logger.warning(f"Skipping {path}: not found")
+            print(f"Skipping {path}: not found")
+    return ledgers
+
+
+def report_names(ledgers):
+    # Output file prefix per ledger, made unique when two ledgers share a file name
+    names = {}
+    used = set()
+    for ledger in ledgers:
+        base = os.path.splitext(os.path.basename(os.path.normpath(ledger)))[0]
+        name = base
+        suffix = 2
+        while name in used:
+            name = f"{base}-{suffix}"
+            suffix += 1
+        used.add(name)
+        names[ledger] = name
+    return names
+
+
+def render_report(ledger, out_dir, name, formats=FORMATS, theme="Light", size=(1000, 600), downsample=True,
+                  start=None, end=None):
+    # Runs in a worker process: loads one ledger and writes its charts. Returns a summary dict and
+    # never raises, so one bad ledger cannot take the rest of the batch down with it.
+    result = {"ledger": ledger, "files": [], "rows": 0, "load": 0.0, "render": 0.0, "error": None}
+    started = time.perf_counter()
+    try:
+        manager = TransactionManager(store=ReadOnlyStore(ledger, start, end))
+        # The manager logs load failures and carries on with an empty ledger; a report has to fail
+        if manager.load_error is not None:
+            raise manager.load_error
+        # Rollups saved by the app belong to whatever ledger sits in the working directory
+        manager.rollups_path = None
+        result["rows"] = len(manager.get_transactions())
+        stats_manager = StatsManager(manager)
+        stats_manager.downsample = downsample
+        result["load"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        pdf = PdfPages(os.path.join(out_dir, f"{name}.pdf")) if "pdf" in formats else None
+        try:
+            for chart in CHARTS:
+                # Drawn once, then saved in every requested format
+                fig = build_figure(chart, stats_manager.chart_data(chart), theme, size, downsample)
+                if fig is None:
+                    continue
+                if "png" in formats:
+                    path = os.path.join(out_dir, f"{name}-{chart}.png")
+                    with open(path, 'wb') as f:
+                        f.write(figure_png(fig))
+                    result["files"].append(path)
+                if pdf is not None:
+                    pdf.savefig(fig)
+        finally:
+            if pdf is not None:
+                pages = pdf.get_pagecount()
+                pdf.close()
+                if pages:
+                    result["files"].append(os.path.join(out_dir, f"{name}.pdf"))
+                else:
+                    os.remove(os.path.join(out_dir, f"{name}.pdf"))
+        result["render"] = time.perf_counter() - started
+        logger.debug(f"Report for {ledger}: {len(result['files'])} files in {result['load'] + result['render']:.2f}s")
+    except Exception as e:
+        logger.error(f"Error generating report for {ledger}: {e}")
+        result["error"] = str(e)
+    return result
+
+
+def generate_reports(ledgers, out_dir, formats=FORMATS, theme="Light", size=(1000, 600), downsample=True,
+                     workers=None, start=None, end=None):
+    # Renders every ledger in a process pool and yields each result as it finishes
+    os.makedirs(out_dir, exist_ok=True)
+    names = report_names(ledgers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(render_report, ledger, out_dir, names[ledger], formats, theme, size, downsample,
+                               start, end)
+                   for ledger in ledgers]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def parse_size(text):
+    try:
+        width, height = (int(part) for part in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT in pixels, got {text}")
+    return width, height
+
+
+def parse_day(text):
+    timestamp = parse_timestamp(text)
+    if timestamp is None:
+        raise argparse.ArgumentTypeError(f"expected a YYYY-MM-DD date, got {text}")
+    return timestamp
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render chart reports for ledger files without opening the GUI.")
+    parser.add_argument("paths", nargs="+", help="ledger files (JSON or SQLite), partitioned ledger directories, "
+                                                 "or directories of ledger files")
+    parser.add_argument("-o", "--out", default="reports", help="output directory (default: reports)")
+    parser.add_argument("-f", "--format", choices=FORMATS + ("both",), default="both",
+                        help="png files per chart, one pdf per ledger, or both (default)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--theme", choices=("Light", "Dark"), default="Light")
+    parser.add_argument("--size", type=parse_size, default=(1000, 600), help="chart size in pixels (default: 1000x600)")
+    parser.add_argument("--full", action="store_true", help="plot every point instead of simplifying large ledgers")
+    parser.add_argument("--start", type=parse_day, help="only include transactions on or after this date (YYYY-MM-DD)")
+    parser.add_argument("--end", type=parse_day, help="only include transactions up to and including this date")
+    args = parser.parse_args(argv)
+
+    ledgers = find_ledgers(args.paths)
+    if not ledgers:
+        print("No ledgers found")
+        return 1
+    formats = FORMATS if args.format == "both" else (args.format,)
+    started = time.perf_counter()
+    failed = 0
+    # --end names the last day included, and ranges are end-exclusive
+    end = None if args.end is None else args.end + SECONDS_PER_DAY
+    for result in generate_reports(ledgers, args.out, formats, args.theme, args.size, not args.full, args.workers,
+                                   args.start, end):
+        if result["error"]:
+            failed += 1
+            print(f"{result['ledger']}: failed: {result['error']}")
+        else:
+            print(f"{result['ledger']}: {result['rows']} transactions, {len(result['files'])} files in "
+                  f"{result['load'] + result['render']:.2f}s (load {result['load']:.2f}s, "
+                  f"render {result['render']:.2f}s)")
+    print(f"Rendered {len(ledgers) - failed} of {len(ledgers)} ledgers into {args.out} "
+          f"in {time.perf_counter() - started:.2f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
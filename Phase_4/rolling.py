@@ -0,0 +1,155 @@
+# Written by: Turner Miles Peeples
+
+import math
+import logging
+from collections import deque
+
+import numpy as np
+
+from transaction import day_of
+
+# Setup logging
+logging.basicConfig(filename='debug.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+WINDOWS = (7, 30, 90)
+
+
+class RollingWindow:
+    # Statistics over the daily totals of the last `days` calendar days, kept up to date as points
+    # arrive in date order: a running sum, Welford's mean/variance with removal for points leaving
+    # the window, and a monotonic deque whose front is always the window's largest day. Only days
+    # with spending are stored; mean and std count every other day in the window as zero.
+    def __init__(self, days):
+        self.days = days
+        self.points = deque()
+        self.total = 0.0
+        # Welford state over the stored points alone
+        self._point_mean = 0.0
+        self._m2 = 0.0
+        self._maxima = deque()
+
+    def _welford_add(self, value):
+        count = len(self.points)
+        delta = value - self._point_mean
+        self._point_mean += delta / count
+        self._m2 += delta * (value - self._point_mean)
+
+    def _welford_remove(self, value):
+        count = len(self.points)
+        if count <= 1:
+            # Start again from the exact state rather than carrying rounding residue forward
+            self._point_mean = self.points[0][1] if count else 0.0
+            self._m2 = 0.0
+            return
+        delta = value - self._point_mean
+        self._point_mean -= delta / count
+        self._m2 -= delta * (value - self._point_mean)
+
+    def push(self, day, value):
+        # day must not be earlier than the last point pushed
+        while self.points and self.points[0][0] <= day - self.days:
+            _, old = self.points.popleft()
+            self.total -= old
+            self._welford_remove(old)
+        while self._maxima and self._maxima[0][0] <= day - self.days:
+            self._maxima.popleft()
+        self.points.append((day, value))
+        self.total += value
+        self._welford_add(value)
+        while self._maxima and self._maxima[-1][1] <= value:
+            self._maxima.pop()
+        self._maxima.append((day, value))
+
+    def grow_last(self, value):
+        # The newest day's total went up to `value`; anything it now beats drops off the maxima deque
+        day, old = self.points.pop()
+        self.total -= old
+        self._welford_remove(old)
+        if self._maxima and self._maxima[-1][0] == day:
+            self._maxima.pop()
+        self.push(day, value)
+
+    @property
+    def mean(self):
+        # Average per calendar day, so it always equals total / days
+        return self._point_mean * len(self.points) / self.days
+
+    @property
+    def std(self):
+        # Sample standard deviation over all `days` daily totals. The zero days are folded into the
+        # points' Welford state with the parallel-variance formula (Chan et al.), still O(1).
+        count, days = len(self.points), self.days
+        if days < 2 or not count:
+            return 0.0
+        m2 = max(self._m2, 0.0) + self._point_mean ** 2 * count * (days - count) / days
+        return math.sqrt(m2 / (days - 1))
+
+    @property
+    def maximum(self):
+        return self._maxima[0][1] if self._maxima else 0.0
+
+
+class RollingStats:
+    # Rolling sum, mean, standard deviation and maximum of daily spending over several calendar
+    # windows (days without spending count as zero), one result per day that had spending. A transaction on the newest day or later is folded in with
+    # O(1) work per window; anything else (a back-dated entry, an edit, a delete) marks the stats
+    # stale and the owner rebuilds them from the daily totals.
+    def __init__(self, categories, windows=WINDOWS):
+        self.categories = tuple(categories)
+        self.windows = tuple(windows)
+        self.stale = False
+        self.days = []
+        self.values = []
+        self._windows = {w: RollingWindow(w) for w in self.windows}
+        self._results = {w: {"sum": [], "mean": [], "std": [], "max": []} for w in self.windows}
+
+    @classmethod
+    def build(cls, categories, days, totals, windows=WINDOWS):
+        stats = cls(categories, windows)
+        for day, total in zip(days, totals):
+            stats.add(day, total)
+        logger.debug(f"Built rolling statistics over {len(stats.days)} days")
+        return stats
+
+    def _record(self, replace):
+        for w, window in self._windows.items():
+            results = self._results[w]
+            for name, value in (("sum", window.total), ("mean", window.mean),
+                                ("std", window.std), ("max", window.maximum)):
+                if replace:
+                    results[name][-1] = value
+                else:
+                    results[name].append(value)
+
+    def add(self, day, amount):
+        if self.stale:
+            return
+        if self.days and day == self.days[-1] and amount >= 0:
+            self.values[-1] += amount
+            for window in self._windows.values():
+                window.grow_last(self.values[-1])
+            self._record(replace=True)
+        elif not self.days or day > self.days[-1]:
+            self.days.append(day)
+            self.values.append(amount)
+            for window in self._windows.values():
+                window.push(day, amount)
+            self._record(replace=False)
+        else:
+            self.stale = True
+
+    def add_transaction(self, transaction):
+        if transaction.timestamp is not None and transaction.category in self.categories:
+            self.add(day_of(transaction.timestamp), transaction.amount)
+
+    def remove_transaction(self, transaction):
+        if transaction.timestamp is not None and transaction.category in self.categories:
+            self.stale = True
+
+    def series(self, window):
+        # Copies, so the result stays valid while later transactions keep updating these stats
+        results = self._results[window]
+        series = {name: np.array(values, dtype=np.float64) for name, values in results.items()}
+        series["days"] = np.array(self.days, dtype=np.int64)
+        return series
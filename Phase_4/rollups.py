@@ -0,0 +1,157 @@
+# Written by: Turner Miles Peeples
+
+import calendar
+import json
+import os
+import time
+import logging
+
+import numpy as np
+
+from analytics import LedgerColumns
+from journal import write_json_atomic
+from transaction import SECONDS_PER_DAY, day_of
+
+# Setup logging
+logging.basicConfig(filename='debug.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+PERIODS = ("day", "week", "month")
+ROLLUP_FORMAT = 1
+
+
+def week_start(day):
+    # Day number of the ISO week's Monday; day 0 (1970-01-01) was a Thursday
+    return day - (day + 3) % 7
+
+
+def month_start(day):
+    year, month = time.gmtime(day * SECONDS_PER_DAY)[:2]
+    return calendar.timegm((year, month, 1, 0, 0, 0)) // SECONDS_PER_DAY
+
+
+def month_starts(days):
+    # month_start over a NumPy array of day numbers
+    return days.astype("datetime64[D]").astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+
+
+class Rollups:
+    # Pre-aggregated spending per day, ISO week and month. Each table maps the bucket's first day
+    # (a day number) -> {(category, payment method): [count, total]}, so a chart reads one entry per
+    # bucket instead of one per transaction. add()/remove() keep it current as transactions change.
+    def __init__(self):
+        self.tables = {period: {} for period in PERIODS}
+        # Month starts are looked up per day, and a ledger only spans a few thousand distinct days
+        self._month_starts = {}
+
+    @classmethod
+    def build(cls, transactions):
+        # One vectorized group-by per period over the ledger's NumPy columns, rather than three
+        # dict updates per transaction; add()/remove() take over from there
+        rollups = cls()
+        columns = LedgerColumns(transactions)
+        if len(columns):
+            dated = columns.dated
+            days = columns.timestamps[dated] // SECONDS_PER_DAY
+            # Each (category, payment method) pair gets one code, and each (bucket, pair) one key
+            methods = len(columns.payment_methods)
+            width = len(columns.categories) * methods
+            cells = columns.category_codes[dated].astype(np.int64) * methods + columns.method_codes[dated]
+            for period, buckets in (("day", days), ("week", week_start(days)), ("month", month_starts(days))):
+                keys, counts, totals = columns.group_totals(buckets * width + cells, dated)
+                table = rollups.tables[period]
+                for key, count, total in zip(keys.tolist(), counts.tolist(), totals.tolist()):
+                    bucket, cell = divmod(key, width)
+                    category, method = divmod(cell, methods)
+                    table.setdefault(bucket, {})[(columns.categories[category], columns.payment_methods[method])] = \
+                        [count, total]
+        logger.debug(f"Built rollups: {len(rollups.tables['day'])} days, {len(rollups.tables['month'])} months")
+        return rollups
+
+    def _buckets(self, transaction):
+        day = day_of(transaction.timestamp)
+        month = self._month_starts.get(day)
+        if month is None:
+            month = self._month_starts[day] = month_start(day)
+        return (("day", day), ("week", week_start(day)), ("month", month))
+
+    def add(self, transaction):
+        if transaction.timestamp is None:
+            return
+        key = (transaction.category, transaction.payment_method)
+        for period, bucket in self._buckets(transaction):
+            cell = self.tables[period].setdefault(bucket, {}).setdefault(key, [0, 0.0])
+            cell[0] += 1
+            cell[1] += transaction.amount
+
+    def remove(self, transaction):
+        if transaction.timestamp is None:
+            return
+        key = (transaction.category, transaction.payment_method)
+        for period, bucket in self._buckets(transaction):
+            cells = self.tables[period].get(bucket)
+            cell = cells.get(key) if cells else None
+            if cell is None:
+                logger.warning(f"Rollup {period} {bucket} has no entry for {key}")
+                continue
+            cell[0] -= 1
+            cell[1] -= transaction.amount
+            # Empty cells are dropped rather than left holding float residue
+            if cell[0] <= 0:
+                del cells[key]
+                if not cells:
+                    del self.tables[period][bucket]
+
+    def series(self, period, categories=None, payment_methods=None):
+        # (bucket start day numbers, totals) in date order, for the given categories/payment methods
+        buckets = []
+        totals = []
+        for bucket in sorted(self.tables[period]):
+            total = 0.0
+            matched = False
+            for (category, method), (count, amount) in self.tables[period][bucket].items():
+                if (categories is None or category in categories) and \
+                        (payment_methods is None or method in payment_methods):
+                    total += amount
+                    matched = True
+            if matched:
+                buckets.append(bucket)
+                totals.append(total)
+        return buckets, totals
+
+    def totals_by_category(self, categories=None):
+        # Summed from the month table, the smallest one that still covers every dated transaction
+        totals = {}
+        for cells in self.tables["month"].values():
+            for (category, method), (count, amount) in cells.items():
+                if categories is None or category in categories:
+                    totals[category] = totals.get(category, 0) + amount
+        return totals
+
+    def save(self, path, fingerprint):
+        # One flat row per cell: [period, bucket, category, payment method, count, total]
+        rows = [[period, bucket, category, method, count, amount]
+                for period, table in self.tables.items()
+                for bucket, cells in table.items()
+                for (category, method), (count, amount) in cells.items()]
+        write_json_atomic(path, {"format": ROLLUP_FORMAT, "fingerprint": fingerprint, "rows": rows}, indent=None)
+        logger.debug(f"Saved {len(rows)} rollup rows to {path}")
+
+    @classmethod
+    def load(cls, path, fingerprint):
+        # Returns None when the file is missing, unreadable or was written for different ledger contents
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable rollups {path}: {e}")
+            return None
+        if data.get("format") != ROLLUP_FORMAT or data.get("fingerprint") != fingerprint:
+            logger.debug(f"Rollups in {path} do not match the ledger, rebuilding")
+            return None
+        rollups = cls()
+        for period, bucket, category, method, count, amount in data["rows"]:
+            rollups.tables[period].setdefault(bucket, {})[(category, method)] = [count, amount]
+        return rollups
@@ -0,0 +1,183 @@
+# Written by: Turner Miles Peeples
+
+import array
+import mmap
+import os
+import struct
+import sys
+import logging
+
+from transaction import Transaction
+
+# Setup logging
+logging.basicConfig(filename='debug.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TXSNAP02"
+# magic, rows, strings, payment methods, journal seq, source mtime (ns), source size
+HEADER = struct.Struct("<8sqqqqqq")
+# Per-row string columns, stored as int32 indexes into the string table
+STRING_COLUMNS = ("description", "category", "recipient", "payment_method", "status", "raw_date")
+# Timestamp of a row without a readable date (its raw_date, if any, holds the text from the file)
+NO_TIMESTAMP = -2**63
+
+
+def snapshot_path_for(json_path):
+    return os.path.splitext(json_path)[0] + ".snap"
+
+
+def _padded(data):
+    # Every section starts on an 8-byte boundary
+    return data + b"\0" * (-len(data) % 8)
+
+
+def write_snapshot(json_path, transactions, payment_methods, journal_seq=0):
+    # Must run after json_path has been written: the snapshot is only trusted while
+    # the JSON file still has the size and mtime recorded here.
+    strings = {}
+
+    def string_index(value):
+        if value is None:
+            return -1
+        if value not in strings:
+            strings[value] = len(strings)
+        return strings[value]
+
+    ids = array.array('q')
+    amounts = array.array('d')
+    timestamps = array.array('q')
+    columns = {name: array.array('i') for name in STRING_COLUMNS}
+    for t in transactions:
+        ids.append(t.id)
+        amounts.append(t.amount)
+        timestamps.append(t.timestamp if t.timestamp is not None else NO_TIMESTAMP)
+        for name in STRING_COLUMNS:
+            columns[name].append(string_index(getattr(t, name)))
+    methods = array.array('i', (string_index(m) for m in payment_methods))
+
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = array.array('q', [0])
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+
+    stat = os.stat(json_path)
+    path = snapshot_path_for(json_path)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(ids), len(encoded), len(methods), journal_seq, stat.st_mtime_ns, stat.st_size))
+        for section in [ids, amounts, timestamps] + [columns[name] for name in STRING_COLUMNS] + [methods, offsets]:
+            f.write(_padded(section.tobytes()))
+        f.write(b"".join(encoded))
+    os.replace(tmp_path, path)
+    logger.debug(f"Wrote binary snapshot {path} ({len(ids)} rows, {len(encoded)} strings)")
+
+
+class SnapshotReader:
+    # Same interface as LedgerReader (fields, pages, iter_transactions), but rows come
+    # straight out of fixed-width columns in a memory-mapped file and strings are decoded on demand.
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, rows, string_count, method_count, journal_seq, self.source_mtime_ns, self.source_size = \
+                HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a transaction snapshot")
+            self.rows = rows
+            view = memoryview(self._mm)
+            offset = HEADER.size
+
+            def column(fmt, count):
+                nonlocal offset
+                size = struct.calcsize(fmt) * count
+                section = view[offset:offset + size].cast(fmt)
+                offset += size + (-size % 8)
+                return section
+
+            self._ids = column('q', rows)
+            self._amounts = column('d', rows)
+            self._timestamps = column('q', rows)
+            self._columns = [column('i', rows) for _ in STRING_COLUMNS]
+            methods = column('i', method_count)
+            self._offsets = column('q', string_count + 1)
+            self._blob_start = offset
+            self._strings = [None] * string_count
+            self._views = [self._ids, self._amounts, self._timestamps, methods, self._offsets] + self._columns + [view]
+        except Exception:
+            self.close()
+            raise
+
+        self.empty = False
+        self.fields = {
+            "payment_methods": [self._decode(i) for i in methods],
+            "journal_seq": journal_seq
+        }
+
+    def __len__(self):
+        return self.rows
+
+    def _decode(self, index):
+        start = self._blob_start + self._offsets[index]
+        end = self._blob_start + self._offsets[index + 1]
+        return self._mm[start:end].decode('utf-8')
+
+    def _string_table(self):
+        # Every string is decoded once, up front. A trailing None means index -1 (no value) needs no special case.
+        blob = self._mm[self._blob_start:self._blob_start + self._offsets[len(self._offsets) - 1]]
+        offsets = self._offsets.tolist()
+        table = [blob[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+        # Category, payment method and status strings are shared with the rest of the app
+        for column in (1, 3, 4):
+            for index in set(self._columns[column].tolist()):
+                if index >= 0:
+                    table[index] = sys.intern(table[index])
+        table.append(None)
+        return table
+
+    def _rows(self, start, stop, table):
+        ids = self._ids[start:stop].tolist()
+        amounts = self._amounts[start:stop].tolist()
+        timestamps = [None if timestamp == NO_TIMESTAMP else timestamp
+                      for timestamp in self._timestamps[start:stop].tolist()]
+        descriptions, categories, recipients, methods, statuses, raw_dates = (
+            [table[i] for i in column[start:stop].tolist()] for column in self._columns)
+        restore = Transaction.restore
+        return [restore(*fields) for fields in zip(ids, descriptions, amounts, categories, recipients, timestamps,
+                                                    methods, statuses, raw_dates)]
+
+    def iter_transactions(self):
+        for page in self.pages(500):
+            yield from page
+
+    def pages(self, page_size):
+        try:
+            table = self._string_table()
+            for start in range(0, self.rows, page_size):
+                yield self._rows(start, min(start + page_size, self.rows), table)
+        finally:
+            self.close()
+
+    def close(self):
+        for view in getattr(self, "_views", []):
+            view.release()
+        self._views = []
+        if not self._mm.closed:
+            self._mm.close()
+
+
+def open_snapshot(json_path):
+    # Returns a SnapshotReader when a snapshot matching the current JSON file exists, otherwise None
+    path = snapshot_path_for(json_path)
+    if not os.path.exists(path) or not os.path.exists(json_path):
+        return None
+    try:
+        reader = SnapshotReader(path)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable snapshot {path}: {e}")
+        return None
+    stat = os.stat(json_path)
+    if (reader.source_mtime_ns, reader.source_size) != (stat.st_mtime_ns, stat.st_size):
+        logger.debug(f"Snapshot {path} is stale, falling back to {json_path}")
+        reader.close()
+        return None
+    return reader
@@ -0,0 +1,163 @@
+# Written by: Turner Miles Peeples
+
+import json
+import os
+import sqlite3
+import sys
+import logging
+
+# Setup logging
+logging.basicConfig(filename='debug.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAYMENT_METHODS = ["Credit Card", "Debit Card", "Bank Transfer"]
+
+# Transaction dict key -> table column
+COLUMNS = [
+    ("Id", "id"),
+    ("Description", "description"),
+    ("Amount", "amount"),
+    ("Category", "category"),
+    ("Recipient", "recipient"),
+    ("Date", "date"),
+    ("PaymentMethod", "payment_method"),
+    ("Status", "status"),
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    description TEXT,
+    amount REAL NOT NULL,
+    category TEXT NOT NULL,
+    recipient TEXT,
+    date TEXT NOT NULL,
+    payment_method TEXT,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions(category);
+CREATE INDEX IF NOT EXISTS idx_transactions_payment_method ON transactions(payment_method);
+CREATE INDEX IF NOT EXISTS idx_transactions_status ON transactions(status);
+CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(date);
+CREATE TABLE IF NOT EXISTS payment_methods (
+    name TEXT PRIMARY KEY,
+    position INTEGER NOT NULL
+);
+"""
+
+INSERT_TRANSACTION = (
+    f"INSERT INTO transactions ({', '.join(c for _, c in COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in COLUMNS)})"
+)
+
+
+def _row_values(transaction):
+    return [transaction.get(key) for key, _ in COLUMNS]
+
+
+class SQLiteStore:
+    def __init__(self, db_path='transactions.db'):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] == 0:
+            # Fresh database: seed the same default payment methods the JSON file starts with
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO payment_methods (name, position) VALUES (?, ?)",
+                    [(name, i) for i, name in enumerate(DEFAULT_PAYMENT_METHODS)]
+                )
+                self.conn.execute("PRAGMA user_version = 1")
+
+    def iter_load(self, page_size=500):
+        keys = [key for key, _ in COLUMNS]
+        cursor = self.conn.execute(f"SELECT {', '.join(c for _, c in COLUMNS)} FROM transactions ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(page_size)
+            if not rows:
+                break
+            yield [dict(zip(keys, row)) for row in rows]
+        return [row[0] for row in self.conn.execute("SELECT name FROM payment_methods ORDER BY position")]
+
+    def append(self, op, **payload):
+        with self.conn:
+            if op == "add":
+                self.conn.execute(INSERT_TRANSACTION, _row_values(payload["transaction"]))
+            elif op == "add_many":
+                self.conn.executemany(INSERT_TRANSACTION, [_row_values(t) for t in payload["transactions"]])
+            elif op == "update":
+                transaction = payload["transaction"]
+                assignments = ", ".join(f"{c} = ?" for key, c in COLUMNS if key != "Id")
+                self.conn.execute(
+                    f"UPDATE transactions SET {assignments} WHERE id = ?",
+                    _row_values(transaction)[1:] + [transaction["Id"]]
+                )
+            elif op == "delete":
+                self.conn.execute("DELETE FROM transactions WHERE id = ?", (payload["id"],))
+            elif op == "add_payment_method":
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO payment_methods (name, position) "
+                    "VALUES (?, (SELECT COALESCE(MAX(position), -1) + 1 FROM payment_methods))",
+                    (payload["method"],)
+                )
+            elif op == "remove_payment_method":
+                self.conn.execute("DELETE FROM payment_methods WHERE name = ?", (payload["method"],))
+            elif op == "reassign":
+                self.conn.execute(
+                    "UPDATE transactions SET payment_method = ? WHERE payment_method = ?",
+                    (payload["new"], payload["old"])
+                )
+            else:
+                logger.warning(f"Unknown store operation: {op}")
+        # Every statement is committed on its own, so there is never anything to compact
+        return False
+
+    def compact(self, transactions, payment_methods, background=False):
+        with self.conn:
+            self.conn.execute("DELETE FROM transactions")
+            self.conn.execute("DELETE FROM payment_methods")
+            self.conn.executemany(INSERT_TRANSACTION, [_row_values(t) for t in transactions])
+            self.conn.executemany(
+                "INSERT INTO payment_methods (name, position) VALUES (?, ?)",
+                [(name, i) for i, name in enumerate(payment_methods)]
+            )
+        logger.debug(f"Rewrote {self.db_path} from memory")
+
+    def flush(self):
+        # Every append is already committed
+        pass
+
+    def close(self, transactions, payment_methods):
+        self.conn.close()
+
+
+def migrate_json_to_sqlite(json_path='transactions.json', db_path='transactions.db'):
+    with open(json_path, 'r') as f:
+        content = f.read().strip()
+    data = json.loads(content) if content else {}
+    transactions = data.get("transactions", [])
+    payment_methods = data.get("payment_methods", list(DEFAULT_PAYMENT_METHODS))
+
+    store = SQLiteStore(db_path)
+    existing = store.conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+    if existing:
+        store.conn.close()
+        raise ValueError(f"{db_path} already holds {existing} transactions; refusing to migrate twice")
+    store.compact(transactions, payment_methods)
+    store.conn.close()
+    logger.debug(f"Migrated {len(transactions)} transactions from {json_path} to {db_path}")
+    return len(transactions)
+
+
+if __name__ == "__main__":
+    json_path = sys.argv[1] if len(sys.argv) > 1 else 'transactions.json'
+    db_path = sys.argv[2] if len(sys.argv) > 2 else 'transactions.db'
+    if not os.path.exists(json_path):
+        print(f"{json_path} not found")
+        sys.exit(1)
+    try:
+        count = migrate_json_to_sqlite(json_path, db_path)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    print(f"Migrated {count} transactions from {json_path} to {db_path}")
@@ -1,138 +1,383 @@
 # Written by: Turner Miles Peeples
 
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+import io
 import logging
-from datetime import datetime
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from analytics import LedgerColumns
+from downsample import lttb
+from figure_pool import DPI, FigurePool
+from rolling import RollingStats
+from rollups import PERIODS
+from transaction import SECONDS_PER_DAY
 
 # Setup logging
 logging.basicConfig(filename='debug.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+SPENDING_CATEGORIES = ("Expense", "Invoice")
+# Matches the content colours of the GUI themes
+THEME_COLORS = {
+    "Light": {"bg": "#ffffff", "fg": "#000000"},
+    "Dark": {"bg": "#444444", "fg": "#ffffff"},
+}
+# Rendered PNGs kept for the current data version across themes and sizes, oldest dropped first
+CHART_CACHE_SIZE = 16
+# Point budgets when downsampling is on: a line gets one point every two pixels of width, and
+# a scatter plot with more than this many points per pixel of width is drawn as a hexbin density
+LINE_PIXELS_PER_POINT = 2
+# The bar chart moves from days to weeks to months until every bar gets at least this many pixels
+BAR_MIN_PIXELS = 8
+BAR_WIDTHS = {"day": 0.8, "week": 6, "month": 25}
+SCATTER_POINTS_PER_PIXEL = 5
+# Rolling averages drawn over the daily line, and the window whose spread is shaded around its average
+ROLLING_OVERLAYS = (7, 30, 90)
+ROLLING_BAND = 30
+
+
+def rollup_summary(rollups, rolling=None):
+    # Read straight from the day/week/month rollups, so the cost depends on the number of buckets
+    summary = {
+        "categories": rollups.totals_by_category(SPENDING_CATEGORIES),
+        "series": {period: rollups.series(period, SPENDING_CATEGORIES) for period in PERIODS},
+    }
+    if rolling is None:
+        days, totals = summary["series"]["day"]
+        rolling = RollingStats.build(SPENDING_CATEGORIES, days, totals)
+    summary["rolling"] = {window: rolling.series(window) for window in rolling.windows}
+    return summary
+
+
+def scatter_points(columns):
+    # The scatter plot is the one chart that needs every transaction, taken from the NumPy columns
+    spending = columns.category_mask(SPENDING_CATEGORIES)
+    undated = int(np.count_nonzero(spending & ~columns.dated))
+    if undated:
+        logger.warning(f"Skipped {undated} transactions with an invalid date in the scatter plot")
+    dated = spending & columns.dated
+    return {
+        # matplotlib date numbers are days since the 1970 epoch
+        "scatter_dates": columns.timestamps[dated] / SECONDS_PER_DAY,
+        "scatter_amounts": columns.amounts[dated],
+    }
+
+
+def draw_pie(ax, summary, width=None):
+    categories = summary["categories"]
+    if not categories:
+        return False
+    ax.pie(list(categories.values()), labels=list(categories.keys()), autopct='%1.1f%%', startangle=90)
+    ax.axis('equal')
+    return True
+
+
+def draw_bar(ax, summary, width=None):
+    period = "day"
+    if width is not None:
+        for period in PERIODS:
+            if len(summary["series"][period][0]) <= width // BAR_MIN_PIXELS:
+                break
+    buckets, totals = summary["series"][period]
+    if not buckets:
+        return False
+    # Bucket start days double as matplotlib date numbers
+    ax.bar(buckets, totals, width=BAR_WIDTHS[period], align='edge')
+    ax.xaxis_date()
+    ax.set_xlabel("Date" if period == "day" else period.capitalize())
+    ax.set_ylabel("Amount ($)")
+    ax.set_title("Spending Over Time")
+    return True
+
+
+def draw_scatter(ax, summary, width=None):
+    # width is the canvas width in pixels when downsampling is on, otherwise None
+    dates = summary["scatter_dates"]
+    if not len(dates):
+        logger.debug("No data available for scatter plot")
+        return False
+    if width is not None and len(dates) > width * SCATTER_POINTS_PER_PIXEL:
+        # Past this many points individual markers just merge into a blob, so show the density instead
+        ax.hexbin(dates, summary["scatter_amounts"], gridsize=max(width // 10, 10), bins='log', mincnt=1)
+        logger.debug(f"Drew scatter plot of {len(dates)} points as a hexbin")
+    else:
+        ax.scatter(dates, summary["scatter_amounts"])
+    ax.xaxis_date()
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Amount ($)")
+    ax.set_title("Spending Scatter Plot")
+    return True
+
+
+def draw_line(ax, summary, width=None):
+    days, amounts = summary["series"]["day"]
+    if not days:
+        return False
+    marker = 'o' if len(days) <= 100 else ''
+    lines = [("Daily spending", days, amounts, marker)]
+    for window in ROLLING_OVERLAYS:
+        rolling = summary["rolling"][window]
+        lines.append((f"{window}-day average", rolling["days"], rolling["mean"], ''))
+
+    # A pooled figure already holds the lines, so only their data changes. Colors are fixed so a
+    # reused figure looks the same as a new one.
+    existing = {line.get_label(): line for line in ax.lines}
+    for color, (label, x, y, line_marker) in enumerate(lines):
+        # Day numbers double as matplotlib date numbers, which keeps the axis numeric so it can be downsampled
+        if width is not None:
+            x, y = lttb(x, y, max(width // LINE_PIXELS_PER_POINT, 3))
+        line = existing.pop(label, None)
+        if line is None:
+            ax.plot(x, y, marker=line_marker, label=label, color=f"C{color}",
+                    linewidth=1.5 if color else 1, zorder=3 if color else 2)
+        else:
+            line.set_data(x, y)
+            line.set_marker(line_marker)
+    for line in existing.values():
+        line.remove()
+
+    # One standard deviation either side of the band window's average
+    for collection in list(ax.collections):
+        collection.remove()
+    band = summary["rolling"][ROLLING_BAND]
+    low, high = band["mean"] - band["std"], band["mean"] + band["std"]
+    ax.fill_between(band["days"], np.maximum(low, 0), high, color=f"C{ROLLING_OVERLAYS.index(ROLLING_BAND) + 1}",
+                    alpha=0.15, linewidth=0, label=f"{ROLLING_BAND}-day \u00b11 std. dev.")
+    ax.relim()
+    ax.autoscale_view()
+    ax.legend(loc="upper left", fontsize="small")
+    ax.xaxis_date()
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Amount ($)")
+    ax.set_title("Spending Trend Over Time")
+    return True
+
+
+CHARTS = {
+    "pie": draw_pie,
+    "bar": draw_bar,
+    "scatter": draw_scatter,
+    "line": draw_line,
+}
+
+
+def _apply_theme(fig, ax, theme):
+    colors = THEME_COLORS.get(theme, THEME_COLORS["Light"])
+    fig.set_facecolor(colors["bg"])
+    ax.set_facecolor(colors["bg"])
+    ax.title.set_color(colors["fg"])
+    ax.xaxis.label.set_color(colors["fg"])
+    ax.yaxis.label.set_color(colors["fg"])
+    ax.tick_params(colors=colors["fg"])
+    for spine in ax.spines.values():
+        spine.set_color(colors["fg"])
+    for text in ax.texts:
+        text.set_color(colors["fg"])
+    legend = ax.get_legend()
+    if legend is not None:
+        legend.get_frame().set_facecolor(colors["bg"])
+        for text in legend.get_texts():
+            text.set_color(colors["fg"])
+
+
+# Charts whose draw function updates the artists already on a reused axes instead of starting over
+UPDATES_IN_PLACE = ("line",)
+
+_figure_pool = FigurePool()
+
+
+def build_figure(chart, summary, theme="Light", size=(640, 480), downsample=True, fig=None):
+    # Uses Figure directly rather than pyplot, so it is safe off the main thread and nothing
+    # is kept alive in pyplot's global registry. Pass fig to draw on a pooled figure.
+    if fig is None:
+        fig = Figure(figsize=(size[0] / DPI, size[1] / DPI), dpi=DPI)
+        fig.add_subplot()
+    ax = fig.axes[0]
+    if chart not in UPDATES_IN_PLACE:
+        ax.clear()
+    if not CHARTS[chart](ax, summary, size[0] if downsample else None):
+        return None
+    if chart != "pie":
+        ax.tick_params(axis='x', labelrotation=45)
+    _apply_theme(fig, ax, theme)
+    fig.tight_layout()
+    return fig
+
+
+def figure_png(fig):
+    buffer = io.BytesIO()
+    canvas = fig.canvas if isinstance(fig.canvas, FigureCanvasAgg) else FigureCanvasAgg(fig)
+    canvas.print_png(buffer)
+    return buffer.getvalue()
+
+
+def render_png(chart, summary, theme="Light", size=(640, 480), downsample=True):
+    # PNG bytes drawn on a pooled figure, or None when there is nothing to plot
+    fig = _figure_pool.acquire(chart, size)
+    try:
+        if build_figure(chart, summary, theme, size, downsample, fig=fig) is None:
+            return None
+        return figure_png(fig)
+    finally:
+        _figure_pool.release(chart, fig)
+
+
 class StatsManager:
     def __init__(self, transaction_manager):
         self.transaction_manager = transaction_manager
+        # Caps the points handed to matplotlib on big ledgers (LTTB line, hexbin scatter); off draws every point
+        self.downsample = True
+        self._summary = None
+        self._summary_version = None
+        self._scatter = None
+        self._scatter_version = None
+        # (chart, data version, theme, size, downsample) -> PNG bytes, or None when there was nothing to plot
+        self._chart_cache = {}
 
-    def get_pie_chart(self, frame):
-        try:
-            transactions = self.transaction_manager.get_transactions()
-            categories = {}
-            for t in transactions:
-                if t["Category"] in ["Expense", "Invoice"]:
-                    categories[t["Category"]] = categories.get(t["Category"], 0) + t["Amount"]
+    def summary(self):
+        # Shared by every chart and recomputed only when the ledger version moves on
+        version = self.transaction_manager.version
+        if self._summary is None or self._summary_version != version:
+            manager = self.transaction_manager
+            self._summary = rollup_summary(manager.rollups(), manager.rolling_stats(SPENDING_CATEGORIES))
+            self._summary_version = version
+            logger.debug(f"Summarised spending for charts at version {version}")
+        return self._summary
 
-            if not categories:
-                return None
+    def rolling_statistics(self, window):
+        # {"days", "sum", "mean", "std", "max"} arrays for a window in ROLLING_OVERLAYS, one entry per
+        # day with spending; each covers the whole calendar window, with days without spending as zero
+        return self.summary()["rolling"][window]
 
-            labels = list(categories.keys())
-            sizes = list(categories.values())
+    def scatter(self):
+        version = self.transaction_manager.version
+        if self._scatter is None or self._scatter_version != version:
+            self._scatter = scatter_points(LedgerColumns(self.transaction_manager.get_transactions()))
+            self._scatter_version = version
+        return self._scatter
 
-            fig, ax = plt.subplots()
-            ax.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90)
-            ax.axis('equal')
-            canvas = FigureCanvasTkAgg(fig, master=frame)
-            canvas.draw()
-            logger.debug("Generated pie chart")
-            return canvas, fig
-        except Exception as e:
-            logger.error(f"Error generating pie chart: {e}")
-            return None
+    def chart_data(self, chart):
+        data = dict(self.summary())
+        if chart == "scatter":
+            data.update(self.scatter())
+        return data
 
-    def get_bar_chart(self, frame):
+    def build_figure(self, chart, theme="Light", size=(640, 480)):
+        return build_figure(chart, self.chart_data(chart), theme, size, self.downsample)
+
+    def render_chart(self, chart, theme="Light", size=(640, 480)):
+        # PNG bytes of the chart, or None when there is no data for it
+        version = self.transaction_manager.version
+        key = (chart, version, theme, tuple(size), self.downsample)
+        if key in self._chart_cache:
+            logger.debug(f"Chart cache hit for {key}")
+            return self._chart_cache[key]
         try:
-            transactions = self.transaction_manager.get_transactions()
-            spending = {}
-            for t in transactions:
-                if t["Category"] in ["Expense", "Invoice"]:
-                    date = t["Date"].split()[0]
-                    spending[date] = spending.get(date, 0) + t["Amount"]
-
-            if not spending:
-                return None
+            image = render_png(chart, self.chart_data(chart), theme, size, self.downsample)
+        except Exception as e:
+            logger.error(f"Error generating {chart} chart: {e}")
+            raise
+        self._store(key, image)
+        logger.debug(f"Rendered {chart} chart at version {version}")
+        return image
 
-            dates = list(spending.keys())
-            amounts = list(spending.values())
+    def _store(self, key, image):
+        # Renders for older versions can never be asked for again
+        for stale in [k for k in self._chart_cache if k[1] != key[1]]:
+            del self._chart_cache[stale]
+        self._chart_cache[key] = image
+        while len(self._chart_cache) > CHART_CACHE_SIZE:
+            del self._chart_cache[next(iter(self._chart_cache))]
 
-            fig, ax = plt.subplots()
-            ax.bar(dates, amounts)
-            ax.set_xlabel("Date")
-            ax.set_ylabel("Amount ($)")
-            ax.set_title("Spending Over Time")
-            plt.xticks(rotation=45)
-            plt.tight_layout()
-            canvas = FigureCanvasTkAgg(fig, master=frame)
-            canvas.draw()
-            logger.debug("Generated bar chart")
-            return canvas, fig
-        except Exception as e:
-            logger.error(f"Error generating bar chart: {e}")
-            return None
+    def cached_chart(self, chart, theme="Light", size=(640, 480)):
+        # (True, PNG bytes or None) on a cache hit for the current data, otherwise (False, None)
+        key = (chart, self.transaction_manager.version, theme, tuple(size), self.downsample)
+        if key in self._chart_cache:
+            return True, self._chart_cache[key]
+        return False, None
+
+    def render_job(self, chart, theme="Light", size=(640, 480)):
+        # Returns a function that renders the chart on any thread. Everything it needs is captured
+        # here on the calling thread: the rollup summary, or when the rollups are not built yet a
+        # loader that builds them inside the job, plus for the scatter plot either the current points
+        # or a copy of the row list to compute them from.
+        manager = self.transaction_manager
+        version = manager.version
+        summary = None
+        load_rollups = None
+        if self._summary is not None and self._summary_version == version or manager.rollups_ready:
+            summary = self.summary()
+        else:
+            # The first build walks every transaction, which would stall the window on a big ledger
+            load_rollups = manager.rollups_loader()
+        scatter = None
+        rows = None
+        if chart == "scatter":
+            scatter = self._scatter if self._scatter_version == version else None
+            rows = None if scatter is not None else list(manager.get_transactions())
+        size = tuple(size)
+        downsample = self.downsample
+
+        def job():
+            rollups = None
+            data = summary
+            if data is None:
+                rollups = load_rollups()
+                data = rollup_summary(rollups)
+            built = data
+            data = dict(data)
+            points = scatter
+            if chart == "scatter":
+                if points is None:
+                    points = scatter_points(LedgerColumns(rows))
+                data.update(points)
+            image = render_png(chart, data, theme, size, downsample)
+            return (chart, version, theme, size, downsample), points, image, rollups, built
+
+        return job
+
+    def accept_render(self, rendered):
+        # Takes a render_job() result back on the main thread. Returns (True, PNG bytes or None),
+        # or (False, None) when the data changed while it was rendering.
+        key, points, image, rollups, summary = rendered
+        if key[1] != self.transaction_manager.version:
+            logger.debug(f"Dropped stale {key[0]} chart rendered at version {key[1]}")
+            return False, None
+        if rollups is not None and self.transaction_manager.adopt_rollups(rollups, key[1]):
+            self._summary = summary
+            self._summary_version = key[1]
+        if points is not None and self._scatter_version != key[1]:
+            self._scatter = points
+            self._scatter_version = key[1]
+        self._store(key, image)
+        return True, image
+
+    def _tk_chart(self, chart, frame):
+        # Tk is only imported for the embedded canvas, so the module stays usable without a display
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
-    def get_scatter_plot(self, frame):
         try:
-            transactions = self.transaction_manager.get_transactions()
-            amounts = []
-            dates = []
-            for t in transactions:
-                if t["Category"] in ["Expense", "Invoice"]:
-                    try:
-                        # Try the full datetime format first
-                        date = datetime.strptime(t["Date"], "%Y-%m-%d %H:%M:%S")
-                    except ValueError:
-                        try:
-                            # Fallback to date-only format and add a default time
-                            date = datetime.strptime(t["Date"], "%Y-%m-%d")
-                        except ValueError:
-                            logger.warning(f"Skipping transaction with invalid date format: {t['Date']}")
-                            continue
-                    amounts.append(t["Amount"])
-                    dates.append(date)
-
-            if not amounts or not dates:
-                logger.debug("No data available for scatter plot")
+            fig = self.build_figure(chart)
+            if fig is None:
                 return None
-
-            fig, ax = plt.subplots()
-            ax.scatter(dates, amounts)
-            ax.set_xlabel("Date")
-            ax.set_ylabel("Amount ($)")
-            ax.set_title("Spending Scatter Plot")
-            plt.xticks(rotation=45)
-            plt.tight_layout()
             canvas = FigureCanvasTkAgg(fig, master=frame)
             canvas.draw()
-            logger.debug("Generated scatter plot")
+            logger.debug(f"Generated {chart} chart")
             return canvas, fig
         except Exception as e:
-            logger.error(f"Error generating scatter plot: {e}")
+            logger.error(f"Error generating {chart} chart: {e}")
             return None
 
-    def get_line_graph(self, frame):
-        try:
-            transactions = self.transaction_manager.get_transactions()
-            spending = {}
-            for t in transactions:
-                if t["Category"] in ["Expense", "Invoice"]:
-                    date = t["Date"].split()[0]
-                    spending[date] = spending.get(date, 0) + t["Amount"]
-
-            if not spending:
-                return None
+    def get_pie_chart(self, frame):
+        return self._tk_chart("pie", frame)
 
-            dates = list(spending.keys())
-            amounts = list(spending.values())
+    def get_bar_chart(self, frame):
+        return self._tk_chart("bar", frame)
 
-            fig, ax = plt.subplots()
-            ax.plot(dates, amounts, marker='o')
-            ax.set_xlabel("Date")
-            ax.set_ylabel("Amount ($)")
-            ax.set_title("Spending Trend Over Time")
-            plt.xticks(rotation=45)
-            plt.tight_layout()
-            canvas = FigureCanvasTkAgg(fig, master=frame)
-            canvas.draw()
-            logger.debug("Generated line graph")
-            return canvas, fig
-        except Exception as e:
-            logger.error(f"Error generating line graph: {e}")
-            return None
\ No newline at end of file
+    def get_scatter_plot(self, frame):
+        return self._tk_chart("scatter", frame)
+
+    def get_line_graph(self, frame):
+        return self._tk_chart("line", frame)
@@ -0,0 +1,192 @@
+# Written by: Turner Miles Peeples
+
+import calendar
+import sys
+import time
+import logging
+from collections.abc import MutableMapping
+from datetime import date, datetime
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+DATE_ONLY_FORMAT = "%Y-%m-%d"
+SECONDS_PER_DAY = 86400
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Setup logging
+logging.basicConfig(filename='debug.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Dict key -> slot name
+FIELDS = {
+    "Id": "id",
+    "Description": "description",
+    "Amount": "amount",
+    "Category": "category",
+    "Recipient": "recipient",
+    "Date": "timestamp",
+    "PaymentMethod": "payment_method",
+    "Status": "status",
+}
+INTERNED = ("category", "payment_method", "status")
+
+
+def intern_field(value):
+    # Category, PaymentMethod and Status are shared strings; a null in the file becomes ""
+    return sys.intern("" if value is None else str(value))
+
+
+def parse_amount(value):
+    # Amounts are floats in memory; a null or unreadable amount in the file counts as 0.0
+    if type(value) is float:
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        if value is not None:
+            logger.warning(f"Invalid amount {value!r}, using 0.0")
+        return 0.0
+
+
+def assign_ids(rows):
+    # Rows saved before transactions had ids get the next free ones, in file order
+    next_id = max((row["Id"] for row in rows if row.get("Id") is not None), default=0) + 1
+    assigned = 0
+    for row in rows:
+        if row.get("Id") is None:
+            row["Id"] = next_id
+            next_id += 1
+            assigned += 1
+    return assigned
+
+
+def parse_timestamp(value):
+    # Dates are wall-clock strings with no zone, so they are stored as if they were UTC.
+    # That keeps the round trip to the original string exact and free of DST gaps.
+    if isinstance(value, str) and len(value) == 19 and value[4] == value[7] == "-" and value[10] == " " \
+            and value[13] == value[16] == ":":
+        # Every saved date has this shape, which fromisoformat reads many times faster than strptime.
+        # Anything it rejects (a leap second, say) still gets the strptime verdict below.
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            pass
+        else:
+            return (parsed.toordinal() - EPOCH_ORDINAL) * SECONDS_PER_DAY + parsed.hour * 3600 + \
+                parsed.minute * 60 + parsed.second
+    for fmt in (DATE_FORMAT, DATE_ONLY_FORMAT):
+        try:
+            return calendar.timegm(datetime.strptime(value, fmt).timetuple())
+        except (ValueError, TypeError):
+            continue
+    return None
+
+
+def format_timestamp(timestamp):
+    return time.strftime(DATE_FORMAT, time.gmtime(timestamp))
+
+
+def day_of(timestamp):
+    # Whole days since the epoch; timestamps are wall-clock-as-UTC, so this is the calendar day
+    return timestamp // SECONDS_PER_DAY
+
+
+def month_of(timestamp):
+    # "YYYY-MM", which also sorts in date order
+    return time.strftime("%Y-%m", time.gmtime(timestamp))
+
+
+class Transaction(MutableMapping):
+    __slots__ = ("id", "description", "amount", "category", "recipient", "timestamp",
+                 "payment_method", "status", "raw_date")
+
+    def __init__(self, Description, Amount, Category, Recipient, Date, PaymentMethod, Status, Id=None):
+        self.id = Id
+        self.description = Description
+        self.amount = parse_amount(Amount)
+        self.category = intern_field(Category)
+        self.recipient = Recipient
+        self.payment_method = intern_field(PaymentMethod)
+        self.status = intern_field(Status)
+        self.raw_date = None
+        self._set_date(Date)
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, cls):
+            return data
+        return cls(data.get("Description", ""), data.get("Amount", 0.0), data.get("Category", ""),
+                   data.get("Recipient", ""), data.get("Date", ""), data.get("PaymentMethod", ""),
+                   data.get("Status", ""), data.get("Id"))
+
+    @classmethod
+    def restore(cls, Id, Description, Amount, Category, Recipient, timestamp, PaymentMethod, Status, raw_date=None):
+        # Rebuilds a row from a store that already holds clean values (a float amount, a parsed
+        # timestamp, shared strings), skipping the checks __init__ runs on outside input
+        transaction = cls.__new__(cls)
+        transaction.id = Id
+        transaction.description = Description
+        transaction.amount = Amount
+        transaction.category = Category
+        transaction.recipient = Recipient
+        transaction.timestamp = timestamp
+        transaction.payment_method = PaymentMethod
+        transaction.status = Status
+        transaction.raw_date = raw_date
+        return transaction
+
+    def _set_date(self, value):
+        if isinstance(value, int):
+            self.timestamp = value
+            self.raw_date = None
+            return
+        self.timestamp = parse_timestamp(value)
+        # Unparseable dates are kept verbatim so saving never loses what was in the file
+        self.raw_date = value if self.timestamp is None else None
+
+    @property
+    def date(self):
+        if self.timestamp is None:
+            return self.raw_date
+        return format_timestamp(self.timestamp)
+
+    def copy(self):
+        clone = Transaction.__new__(Transaction)
+        for name in self.__slots__:
+            setattr(clone, name, getattr(self, name))
+        return clone
+
+    def to_dict(self):
+        return {key: self[key] for key in FIELDS}
+
+    def __getitem__(self, key):
+        if key == "Date":
+            return self.date
+        try:
+            return getattr(self, FIELDS[key])
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key == "Date":
+            self._set_date(value)
+            return
+        if key not in FIELDS:
+            raise KeyError(key)
+        name = FIELDS[key]
+        if name in INTERNED:
+            value = intern_field(value)
+        elif name == "amount":
+            value = parse_amount(value)
+        setattr(self, name, value)
+
+    def __delitem__(self, key):
+        raise TypeError("Transaction fields cannot be deleted")
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __repr__(self):
+        return f"Transaction({self.to_dict()})"
@@ -0,0 +1,106 @@
+# Written by: Turner Miles Peeples
+
+import os
+import threading
+import time
+import logging
+
+from journal import DEFAULT_PAYMENT_METHODS, write_json_atomic
+from ledger_reader import LedgerReader
+from snapshot import open_snapshot, write_snapshot
+
+# Setup logging
+logging.basicConfig(filename='debug.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindStore:
+    # Keeps the plain transactions.json layout, but changes only mark the ledger dirty and a
+    # background thread rewrites the file once things have been quiet for `delay` seconds, or
+    # `max_delay` seconds after the first unsaved change if edits keep coming. A burst of edits
+    # therefore costs one write, and the caller never waits on the disk.
+    def __init__(self, path='transactions.json', delay=0.5, max_delay=2.0):
+        self.path = path
+        self.delay = delay
+        self.max_delay = max(max_delay, delay)
+        self.writes = 0
+        self._pending = None
+        self._lock = threading.Lock()
+        # Held for a whole write, so flush() and the worker never write at the same time
+        self._write_lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def iter_load(self, page_size=500):
+        if not os.path.exists(self.path):
+            return list(DEFAULT_PAYMENT_METHODS)
+        reader = open_snapshot(self.path) or LedgerReader(self.path)
+        yield from reader.pages(page_size)
+        return reader.fields.get("payment_methods", list(DEFAULT_PAYMENT_METHODS))
+
+    def append(self, op, **payload):
+        # The file is always rewritten whole, so every change just asks for a (coalesced) rewrite
+        return True
+
+    def compact(self, transactions, payment_methods, background=False):
+        with self._lock:
+            # The manager only ever appends to this list or swaps it for a new one, so keeping
+            # the reference is safe; any row edited mid-write is dirty again and gets rewritten.
+            self._pending = (transactions, list(payment_methods))
+        if background:
+            self._dirty.set()
+        else:
+            self.flush()
+
+    def _run(self):
+        # Every wait is timed and followed by a _closed check, so a set() from close() that lands
+        # just before a clear() can delay the exit by one `delay` but never block it
+        while not self._closed:
+            if not self._dirty.wait(self.delay):
+                continue
+            # Wait for the burst to settle; every change in the meantime restarts the delay, up to
+            # max_delay after the first change so a steady stream of edits cannot hold the write back
+            deadline = time.monotonic() + self.max_delay
+            while not self._closed:
+                self._dirty.clear()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._dirty.wait(min(self.delay, remaining)):
+                    break
+            if self._closed:
+                # close() writes the final state itself
+                return
+            self.flush()
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, None
+            if pending is None:
+                return
+            transactions, payment_methods = pending
+            try:
+                # Payment methods go first so a streaming reader has them before the first page
+                write_json_atomic(self.path, {
+                    "payment_methods": payment_methods,
+                    "transactions": [t.to_dict() for t in transactions]
+                })
+                self.writes += 1
+                logger.debug(f"Write-behind saved {len(transactions)} transactions to {self.path}")
+            except Exception as e:
+                logger.error(f"Error saving data: {e}")
+                with self._lock:
+                    # Keep the data for the next attempt unless something newer has arrived
+                    if self._pending is None:
+                        self._pending = pending
+
+    def close(self, transactions, payment_methods):
+        self.compact(transactions, payment_methods)
+        self._closed = True
+        self._dirty.set()
+        self._worker.join()
+        try:
+            write_snapshot(self.path, transactions, payment_methods)
+        except Exception as e:
+            logger.error(f"Error writing binary snapshot: {e}")